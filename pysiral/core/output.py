@@ -2,10 +2,17 @@
 
 
 import contextlib
+import copy
+import os
 import re
+import sys
 from collections import OrderedDict
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import cached_property, lru_cache, partial
 from pathlib import Path
+from types import SimpleNamespace
+from typing import Tuple, Union
 
 import cftime
 import numpy as np
@@ -13,14 +20,113 @@ import parse
 from attrdict import AttrDict
 from dateutil import parser as dtparser
 from loguru import logger
-from netCDF4 import Dataset, date2num
+from netCDF4 import Dataset, date2num, default_fillvals
 
 from pysiral import psrlcfg
 from pysiral.core import DefaultLoggingClass
 from pysiral.core.config import get_yaml_config
 from pysiral.core.errorhandler import ErrorStatus
 
+# Pattern for attribute placeholders in output definition templates, e.g. {attr_name:option}
+TEMPLATE_ATTR_REGEX = re.compile(r"{.*?}")
+TEMPLATE_ATTR_NO_OPTIONS = ("", )
 
+# Registry of classes that can be retrieved by name with get_output_class
+OUTPUT_CLASSES = {}
+
+
+def register_output_class(cls):
+    """
+    Class decorator that adds a class to the output class registry
+
+    :param cls: class
+
+    :return: unchanged class
+    """
+    OUTPUT_CLASSES[cls.__name__] = cls
+    return cls
+
+
+@lru_cache(maxsize=1024)
+def parse_template_attr(attr_def):
+    """
+    Returns attribute name and options of a template placeholder,
+    e.g. `{attr_name:option1;option2}` -> attr_name, ("option1", "option2").
+    Placeholders without options return a single empty option, which
+    is expected by the attribute getters of the data objects.
+
+    :param attr_def: placeholder string including curly brackets
+
+    :return: attribute name, tuple of options
+    """
+    attr_def = attr_def[1:-1]
+    if ":" not in attr_def:
+        return attr_def, TEMPLATE_ATTR_NO_OPTIONS
+    attr_name, _, optstr = attr_def.partition(":")
+    return attr_name, tuple(optstr.split(";"))
+
+
+def convert_attributes(attdict, time_def):
+    """
+    Replace attribute values in place to match the requirements for
+    netCDF attribute data type rules (single pass over all attributes):
+
+        datetime-like -> number (units & calendar from time definition)
+        bool -> int
+        None -> empty string
+
+    :param attdict: dictionary-like
+    :param time_def: NCDateNumDef instance
+
+    :return: None, will be changed in place
+    """
+    for key, content in list(attdict.items()):
+        if isinstance(content, (datetime, cftime.datetime, cftime.real_datetime)):
+            attdict[key] = time_def.to_num(content)
+        elif type(content) is bool:
+            attdict[key] = int(content)
+        elif content is None:
+            attdict[key] = ""
+
+
+def get_chunksizes(group, dimensions, max_chunksize=512):
+    """
+    Returns the chunk sizes for a netCDF variable that is written in full.
+    The chunks cover the full variable up to a maximum size per dimension.
+
+    :param group: netCDF4 Dataset or Group with the dimensions
+    :param dimensions: tuple of dimension names of the variable
+    :param max_chunksize: maximum chunk size per dimension
+
+    :return: tuple of chunk sizes (None for scalar variables)
+    """
+    if not dimensions:
+        return None
+    return tuple(max(1, min(len(group.dimensions[dim_name]), max_chunksize)) for dim_name in dimensions)
+
+
+def get_output_def_config(output_def):
+    """
+    Returns the content of an output definition file. The parsed file content
+    is cached (invalidated by changes of file modification time or size) and
+    a copy is returned, since output handlers may modify the output definition.
+
+    :param output_def: (str or pathlib.Path): The full file path to the output definition file
+
+    :return: output definition (AttrDict)
+    """
+    output_def = Path(output_def).absolute()
+    stat = output_def.stat()
+    content_dict = _read_output_def_file(output_def, stat.st_mtime_ns, stat.st_size)
+    return AttrDict(copy.deepcopy(content_dict))
+
+
+@lru_cache(maxsize=128)
+def _read_output_def_file(output_def, mtime_ns, size):
+    return get_yaml_config(output_def, output="dict")
+
+
+@register_output_class
 class OutputHandlerBase(DefaultLoggingClass):
     """
     A class that defines properties of output files (content, location, format)
@@ -29,6 +135,9 @@ class OutputHandlerBase(DefaultLoggingClass):
 
     subfolder_format = {"month": "%02g", "year": "%04g", "day": "%02g"}
 
+    # Optional timestamp for the now directory shared by all output handlers
+    run_timestamp = None
+
     def __init__(self,
                  output_def,
                  applicable_data_level=None,
@@ -67,18 +176,25 @@ class OutputHandlerBase(DefaultLoggingClass):
         self._init_from_output_def(output_def)
         self.output_def_filename = output_def
 
-    def fill_template_string(self, template, dataset):
+    def fill_template_string(self, template, dataset, cache=None):
         """ Fill an template string with information of a dataset
-        object (in this case Level2Data) """
-        attributes = self.get_template_attrs(template)
-        result = str(template)
-        for attribute in attributes:
-            attribute_name, option, placeholder = attribute
-            attribute = dataset.get_attribute(attribute_name, *option)
-            if attribute is None:
-                attribute = "unknown"
-            result = result.replace(placeholder, attribute)
-        return result
+        object (in this case Level2Data). An optional dictionary can be
+        passed as cache for attribute values when several templates are
+        filled with the same dataset """
+        if not isinstance(template, str) or "{" not in template:
+            return str(template)
+        cache = {} if cache is None else cache
+
+        # NOTE: All placeholders are substituted in a single pass over the template
+        def get_attribute(match):
+            placeholder = match.group(0)
+            if placeholder not in cache:
+                attribute_name, options = parse_template_attr(placeholder)
+                attribute = dataset.get_attribute(attribute_name, *options)
+                cache[placeholder] = "unknown" if attribute is None else attribute
+            return cache[placeholder]
+
+        return TEMPLATE_ATTR_REGEX.sub(get_attribute, template)
 
     def get_dt_subfolders(self, dt, subfolder_tags):
         """ Returns a list of subdirectories based on a datetime object
@@ -94,24 +210,19 @@ class OutputHandlerBase(DefaultLoggingClass):
     def get_template_attrs(template):
         """ Extract attribute names and options (if defined) for a
         give template string """
-        try:
-            template = template.encode('utf-8').strip()
-        except AttributeError:
-            template = str(template)
-        attr_defs = re.findall("{.*?}", str(template))
-        attrs, options = [], []
+        attr_defs = TEMPLATE_ATTR_REGEX.findall(str(template))
+        template_attrs = []
         for attr_def in attr_defs:
-            attr_name, _, optstr = attr_def[1:-1].partition(":")
-            attrs.append(attr_name)
-            options.append(optstr.split(";"))
-        return zip(attrs, options, attr_defs)
+            attr_name, options = parse_template_attr(attr_def)
+            template_attrs.append((attr_name, options, attr_def))
+        return template_attrs
 
     def _init_from_output_def(self, output_def):
         """ Adds the information for the output def yaml files (either
         full filename or treedict structure) """
         if Path(output_def).is_file():
             try:
-                self._output_def = get_yaml_config(output_def)
+                self._output_def = get_output_def_config(output_def)
             except Exception as ex:
                 self.error.add_error("outputdef-parser-error", ex)
                 self.error.raise_on_error()
@@ -204,18 +315,35 @@ class OutputHandlerBase(DefaultLoggingClass):
     def output_def(self):
         return self._output_def
 
-    @property
+    @classmethod
+    def set_run_timestamp(cls, dt=None):
+        """
+        Set a single timestamp for the now directory of all output handlers
+        (e.g. for a processor run with several output handlers). Passing
+        None resets to the default behaviour (creation time of each handler).
+
+        :param dt: datetime.datetime or None
+        """
+        cls.run_timestamp = dt
+
+    @cached_property
     def now_directory(self):
-        """ Returns a directory suitable string with the current time """
-        return datetime.now().strftime("%Y%m%dT%H%M%S")
+        """ Returns a directory suitable string with the current time
+        (or the run timestamp if set). The value is fixed per instance. """
+        dt = datetime.now() if self.run_timestamp is None else self.run_timestamp
+        return dt.strftime("%Y%m%dT%H%M%S")
 
-    @property
+    @cached_property
     def variable_def(self):
-        variables = sorted(list(self.output_def.variables.keys()))
-        attribute_dicts = [self.output_def.variables[a] for a in variables]
-        return zip(variables, attribute_dicts)
+        """
+        List of variable names and their attribute items from the output definition
+        (both variables and attributes are sorted)
+        """
+        variables = sorted(self.output_def.variables.keys())
+        return [(name, tuple(sorted(self.output_def.variables[name].items()))) for name in variables]
 
 
+@register_output_class
 class DefaultLevel2OutputHandler(OutputHandlerBase):
     """
     Default output handler with pysiral conventions. Uses product directory from
@@ -307,9 +435,10 @@ class DefaultLevel2OutputHandler(OutputHandlerBase):
 
     def get_global_attribute_dict(self, l2):
         attr_dict = OrderedDict()
+        attribute_cache = {}
         for attr_entry in self.output_def.global_attributes:
             attr_name, attr_template = zip(*attr_entry.items())
-            attribute = self.fill_template_string(attr_template[0], l2)
+            attribute = self.fill_template_string(attr_template[0], l2, cache=attribute_cache)
             attr_dict[attr_name[0]] = attribute
         return attr_dict
 
@@ -320,13 +449,17 @@ class DefaultLevel2OutputHandler(OutputHandlerBase):
         # Get the target directory
         # XXX: Assumption time_range is monthly
         directory = Path(self._get_directory_from_dt(time_range.start))
+        if not directory.is_dir():
+            return
+
         # Get list of output files
-        l2output_files = list(directory.glob("*.*"))
+        with os.scandir(directory) as entries:
+            l2output_files = [entry.path for entry in entries if "." in entry.name and entry.is_file()]
 
         # Delete files
         logger.info("Removing %g l2 product files [ %s ] in %s" % (len(l2output_files), self.id, directory))
         for l2output_file in l2output_files:
-            Path(l2output_file).unlink()
+            os.unlink(l2output_file)
 
     def _init_product_directory(self):
         """ Get main product directory from local_machine_def, add mandatory
@@ -343,7 +476,7 @@ class DefaultLevel2OutputHandler(OutputHandlerBase):
         basedir = basedir / self.product_level_subfolder
         self._set_basedir(basedir)
 
-    @property
+    @cached_property
     def default_output_def_filename(self):
         local_settings_path = psrlcfg.pysiral_local_path
         return Path(local_settings_path) / Path(*self.default_file_location)
@@ -355,11 +488,98 @@ class NCDateNumDef(object):
     for netCDF operations
     """
 
+    # Calendars that are compatible with numpy datetime64 (for dates after 1582)
+    np_calendars = ("standard", "gregorian", "proleptic_gregorian")
+
     def __init__(self, units: str = "seconds since 1970-01-01") -> None:
         self.units = units
         self.calendar = "standard"
 
+    def to_num(self, dt: Union[datetime, cftime.datetime]) -> float:
+        """
+        Converts a single datetime-like object to a number with the units
+        and calendar of this instance.
+
+        :param dt: datetime or cftime.datetime
+
+        :return: time as number
+        """
+        np_time_reference = self._np_time_reference
+        if np_time_reference is None or type(dt) is not datetime or dt.tzinfo is not None:
+            return date2num(dt, self.units, self.calendar)
+        reference, time_step = np_time_reference
+        return float((np.datetime64(dt) - reference) / time_step)
+
+    def datetime_array_to_num(self, data: np.ndarray) -> np.ndarray:
+        """
+        Converts datetime arrays (numpy datetime64 or datetime-like objects)
+        to numbers with the units and calendar of this instance. Arrays of
+        other types are returned unchanged.
+
+        :param data: array of any type
+
+        :return: numerical time array or input data
+        """
+
+        # Only arrays of numpy datetime64 or dtype object can contain time information
+        if data.dtype.kind not in ("M", "O") or data.size == 0:
+            return data
+
+        # numpy datetime64 arrays: vectorized conversion
+        np_time_reference = self._np_time_reference
+        if data.dtype.kind == "M" and np_time_reference is not None:
+            reference, time_step = np_time_reference
+            return (data - reference) / time_step
+
+        # datetime-like values are only possible for arrays of dtype object
+        first_value = data.flat[0]
+        if not isinstance(first_value, (datetime, cftime.datetime, cftime.real_datetime)):
+            return data
+
+        # Arrays of naive datetime.datetime objects can also be converted vectorized
+        if np_time_reference is not None and type(first_value) is datetime and first_value.tzinfo is None:
+            reference, time_step = np_time_reference
+            return (data.astype("datetime64[us]") - reference) / time_step
 
+        return date2num(data, self.units, self.calendar)
+
+    @property
+    def _np_time_reference(self) -> Union[Tuple[np.datetime64, np.timedelta64], None]:
+        """
+        numpy datetime64 reference time and timedelta64 time step for the units
+        of this instance (None if units or calendar are not supported by numpy)
+        """
+        if self.calendar not in self.np_calendars:
+            return None
+        return get_np_time_reference(self.units)
+
+
+@lru_cache(maxsize=8)
+def get_np_time_reference(units: str) -> Union[Tuple[np.datetime64, np.timedelta64], None]:
+    """
+    Parses netCDF time units (e.g. `seconds since 1970-01-01`) to a numpy
+    datetime64 reference time and a timedelta64 time step.
+
+    :param units: netCDF time units
+
+    :return: reference time, time step or None if the units cannot be parsed
+    """
+    np_time_units = {"days": "D", "hours": "h", "minutes": "m", "seconds": "s",
+                     "milliseconds": "ms", "microseconds": "us"}
+    unit_str, _, reference_str = units.partition(" since ")
+    np_time_unit = np_time_units.get(unit_str.strip())
+    if np_time_unit is None:
+        return None
+    try:
+        reference = dtparser.parse(reference_str)
+    except (dtparser.ParserError, ValueError, OverflowError):
+        return None
+    if reference.tzinfo is not None:
+        reference = reference.astimezone(timezone.utc).replace(tzinfo=None)
+    return np.datetime64(reference, "us"), np.timedelta64(1, np_time_unit)
+
+
+@register_output_class
 class NCDataFile(DefaultLoggingClass):
 
     def __init__(self, output_handler):
@@ -387,7 +607,11 @@ class NCDataFile(DefaultLoggingClass):
         self.time_def = NCDateNumDef()
 
         # TODO: Make this an option?
+        # NOTE: The shuffle filter with a low deflate level provides the
+        #       best compromise between write speed and file size
         self.zlib = True
+        self.complevel = 2
+        self.shuffle = True
 
         self._rootgrp = None
         self._options = None
@@ -395,7 +619,7 @@ class NCDataFile(DefaultLoggingClass):
         self.verbose = False
 
     def set_options(self, **opt_dict):
-        self._options = AttrDict(**opt_dict)
+        self._options = SimpleNamespace(**opt_dict)
 
     def set_processor_settings(self, proc_settings):
         self._proc_settings = proc_settings
@@ -417,23 +641,22 @@ class NCDataFile(DefaultLoggingClass):
 
     def _populate_data_groups(self, level3=False, flip_yc=False):
 
-        lonlat_parameter_names = ["lon", "lat", "longitude", "latitude"]
+        lonlat_parameter_names = frozenset(("lon", "lat", "longitude", "latitude"))
 
         dimdict = self.data.dimdict
-        dims = dimdict.keys()
-
+        dims = tuple(dimdict.keys())
+        dims_by_rank = [dims[:rank] for rank in range(len(dims)+1)]
         for key in dims:
             self._rootgrp.createDimension(key, dimdict[key])
 
-        for parameter_name, attribute_dict in self.output_handler.variable_def:
+        for parameter_name, attribute_items in self.output_handler.variable_def:
 
             # Check if parameter name is also the name or the source
             # parameter
-            if "var_source_name" in attribute_dict.keys():
-                attribute_dict = dict(attribute_dict)
-                var_source_name = attribute_dict.pop("var_source_name")
-            else:
-                var_source_name = parameter_name
+            # NOTE: The attribute dictionary is always copied, since template strings
+            #       are replaced by their values for this data object below
+            attribute_dict = dict(attribute_items)
+            var_source_name = attribute_dict.pop("var_source_name", parameter_name)
 
             # Get the data container
             data = self.data.get_parameter_by_name(var_source_name, raise_on_error=False)
@@ -447,28 +670,33 @@ class NCDataFile(DefaultLoggingClass):
                 self.error.raise_on_error()
 
             # Convert datetime objects to number
-            if isinstance(data[0], (datetime, cftime.datetime, cftime.real_datetime)):
-                data = date2num(data, self.time_def.units, self.time_def.calendar)
+            data = self.time_def.datetime_array_to_num(data)
 
             # Convert bool objects to integer
-            if data.dtype.str == "|b1":
-                data = np.int8(data)
+            # (bool and int8 have the same item size -> no copy required)
+            if data.dtype == np.bool_:
+                data = data.view(np.int8)
 
             # Set dimensions (dependent on product level)
+            # NOTE: The level-3 grid variables (except longitude/latitude) have an
+            #       additional leading time dimension of size one. The data is written
+            #       to the first time index directly and flipping is done with a
+            #       view, which both avoid copies of the full grid.
+            var_index = slice(None)
             if level3:
 
                 if flip_yc:
-                    data = np.flipud(data)
+                    data = data[::-1]
 
                 if parameter_name not in lonlat_parameter_names:
-                    data = np.array([data])
-                    dimensions = tuple(list(dims)[0:len(data.shape)])
+                    var_index = 0
+                    dimensions = dims_by_rank[min(data.ndim+1, len(dims))]
                 else:
-                    dimensions = tuple(list(dims)[1:len(data.shape)+1])
+                    dimensions = dims[1:data.ndim+1]
 
             else:
-                if len(data.shape) == 1:
-                    dimensions = tuple(list(dims)[0:len(data.shape)])
+                if data.ndim == 1:
+                    dimensions = dims_by_rank[min(data.ndim, len(dims))]
 
                 else:
 
@@ -479,7 +707,9 @@ class NCDataFile(DefaultLoggingClass):
 
                     # Add the dimension variable
                     for name, dim_data in aux_dimdict["add_dims"]:
-                        dimvar = self._rootgrp.createVariable(name, dim_data.dtype.str, name, zlib=self.zlib)
+                        chunksizes = get_chunksizes(self._rootgrp, (name, ))
+                        dimvar = self._rootgrp.createVariable(name, dim_data.dtype.str, name, chunksizes=chunksizes,
+                                                              **self.compression_kwargs)
                         dimvar[:] = dim_data
 
                     # The full dimension
@@ -487,9 +717,9 @@ class NCDataFile(DefaultLoggingClass):
 
             # Process attributes
             # This is necessary to e.g., check for flag value types
-            for key in sorted(attribute_dict.keys()):
-                attribute = attribute_dict[key]
-                if isinstance(attribute, str):
+            # NOTE: The attributes are already sorted in the variable definition
+            for key, attribute in attribute_dict.items():
+                if isinstance(attribute, str) and "{" in attribute:
                     attribute_dict[key] = self.output_handler.fill_template_string(attribute, self.data)
 
             # flag_meanings attributes need special handling
@@ -504,68 +734,33 @@ class NCDataFile(DefaultLoggingClass):
             else:
                 # Create and set the variable
                 flag_dtype = data.dtype.str
-            var = self._rootgrp.createVariable(parameter_name, flag_dtype, dimensions, zlib=self.zlib)
-            var[:] = data
+            chunksizes = get_chunksizes(self._rootgrp, dimensions)
+            var = self._rootgrp.createVariable(parameter_name, flag_dtype, dimensions, chunksizes=chunksizes,
+                                               **self.compression_kwargs)
+            var[var_index] = data
 
             # Add Parameter Attributes
             # NOTE: The parameter attributes may be template strings and there are special cases with
             #       flags when the data type of the attribute is not a string
-            for key in sorted(attribute_dict.keys()):
-                attribute = attribute_dict[key]
+            var_attributes = {}
+            for key, attribute in attribute_dict.items():
                 if key == 'flag_values':
                     # The flag_values attribute also needs to be converted to a list of the correct datatype
                     flag_values = [int(x) for x in re.split(r"\s+|, |,", attribute)]
                     attribute = np.asarray(flag_values, dtype=flag_dtype)
-                setattr(var, key, attribute)
+                var_attributes[key] = attribute
+            var.setncatts(var_attributes)
 
     def _create_root_group(self, attdict, **global_attr_keyw):
         """
         Create the root group and add l1b metadata as global attributes
         """
-        self._convert_datetime_attributes(attdict)
-        self._convert_bool_attributes(attdict)
-        self._convert_nonetype_attributes(attdict)
+        convert_attributes(attdict, self.time_def)
         self._set_global_attributes(attdict, **global_attr_keyw)
 
-    def _convert_datetime_attributes(self, attdict):
-        """
-        Replace l1b info parameters of type datetime.datetime by a double
-        representation to match requirements for netCDF attribute data type
-        rules
-        """
-        for key in attdict.keys():
-            content = attdict[key]
-            if isinstance(content, (datetime, cftime.datetime, cftime.real_datetime)):
-                attdict[key] = date2num(content, self.time_def.units, self.time_def.calendar)
-
-    @staticmethod
-    def _convert_bool_attributes(attdict):
-        """
-        Replace l1b info parameters of type bool ['b1'] by a integer
-        representation to match requirements for netCDF attribute data type
-        rules
-        """
-        for key in attdict.keys():
-            content = attdict[key]
-            if type(content) is bool:
-                attdict[key] = int(content)
-
-    @staticmethod
-    def _convert_nonetype_attributes(attdict):
-        """
-        Replace l1b info parameters of type bool ['b1'] by a integer
-        representation to match requirements for netCDF attribute data type
-        rules
-        """
-        for key in attdict.keys():
-            content = attdict[key]
-            if content is None:
-                attdict[key] = ""
-
     def _set_global_attributes(self, attdict, prefix=""):
         """ Save l1b.info dictionary as global attributes """
-        for key in attdict.keys():
-            self._rootgrp.setncattr(prefix+key, attdict[key])
+        self._rootgrp.setncatts({prefix+key: value for key, value in attdict.items()})
 
     def _get_variable_attr_dict(self, parameter):
         """ Retrieve the parameter attributes """
@@ -592,6 +787,9 @@ class NCDataFile(DefaultLoggingClass):
             msg = f"Unable to create netCDF file: {self.full_path}"
             self.error.add_error("nc-runtime-error", msg)
             self.error.raise_on_error()
+        # NOTE: All data variables are written in full, prefilling
+        #       them with fill values is therefore not necessary
+        self._rootgrp.set_fill_off()
 
     def _write_to_file(self):
         self._rootgrp.close()
@@ -613,7 +811,13 @@ class NCDataFile(DefaultLoggingClass):
     def full_path(self):
         return Path(self.export_path) / self.export_filename
 
+    @property
+    def compression_kwargs(self):
+        """ Keywords for netCDF4 variable compression """
+        return dict(zlib=self.zlib, complevel=self.complevel, shuffle=self.shuffle)
+
 
+@register_output_class
 class L1bDataNC(DefaultLoggingClass):
     """
     Class to export a L1bdata object into a netcdf file
@@ -629,6 +833,8 @@ class L1bDataNC(DefaultLoggingClass):
         self.filename = None
         self.time_def = NCDateNumDef()
         self.zlib = True
+        self.complevel = 2
+        self.shuffle = True
         self._rootgrp = None
         self._options = None
         self._proc_settings = None
@@ -658,8 +864,7 @@ class L1bDataNC(DefaultLoggingClass):
 
     def _set_global_attributes(self, attdict, prefix=""):
         """ Save l1b.info dictionary as global attributes """
-        for key in sorted(attdict.keys()):
-            self._rootgrp.setncattr(prefix+key, attdict[key])
+        self._rootgrp.setncatts({prefix+key: value for key, value in attdict.items()})
 
     def _create_root_group(self, attdict, **global_attr_keyw):
         """
@@ -668,9 +873,7 @@ class L1bDataNC(DefaultLoggingClass):
         :param global_attr_keyw:
         :return:
         """
-        self._convert_datetime_attributes(attdict)
-        self._convert_bool_attributes(attdict)
-        self._convert_nonetype_attributes(attdict)
+        convert_attributes(attdict, self.time_def)
         self._set_global_attributes(attdict, **global_attr_keyw)
 
     def _populate_data_groups(self):
@@ -688,7 +891,8 @@ class L1bDataNC(DefaultLoggingClass):
 
             # Create the dimensions
             # (must be available as OrderedDict in data group container
-            dims = content.dimdict.keys()
+            dims = tuple(content.dimdict.keys())
+            dims_by_rank = [dims[:rank] for rank in range(len(dims)+1)]
             for key in dims:
                 dgroup.createDimension(key, content.dimdict[key])
 
@@ -698,60 +902,23 @@ class L1bDataNC(DefaultLoggingClass):
                 data = getattr(content, parameter)
 
                 # Convert datetime objects to number
-                if isinstance(data[0], (datetime, cftime.datetime, cftime.real_datetime)):
-                    data = date2num(data, self.time_def.units, self.time_def.calendar)
+                data = self.time_def.datetime_array_to_num(data)
 
                 # Convert bool objects to integer
-                if data.dtype.str == "|b1":
-                    data = np.int8(data)
-                dimensions = tuple(list(dims)[:len(data.shape)])
+                # (bool and int8 have the same item size -> no copy required)
+                if data.dtype == np.bool_:
+                    data = data.view(np.int8)
+                dimensions = dims_by_rank[min(data.ndim, len(dims))]
                 if self.verbose:
                     print(f" {parameter}", dimensions, data.dtype.str, data.shape)
 
-                var = dgroup.createVariable(parameter, data.dtype.str, dimensions, zlib=self.zlib)
+                chunksizes = get_chunksizes(dgroup, dimensions)
+                var = dgroup.createVariable(parameter, data.dtype.str, dimensions, chunksizes=chunksizes,
+                                            **self.compression_kwargs)
                 var[:] = data
 
                 # Add Parameter Attributes
-                attribute_dict = self._get_variable_attr_dict(parameter)
-                for key in attribute_dict.keys():
-                    setattr(var, key, attribute_dict[key])
-
-    def _convert_datetime_attributes(self, attdict):
-        """
-        Change any datetime-like object to a netCDF compatible numerical representation
-        :param attdict: dictionary-like
-        :return:
-        """
-
-        for key in attdict.keys():
-            content = attdict[key]
-            if isinstance(content, (datetime, cftime.datetime, cftime.real_datetime)):
-                attdict[key] = date2num(content, self.time_def.units, self.time_def.calendar)
-
-    @staticmethod
-    def _convert_bool_attributes(attdict):
-        """
-        Replace l1b info parameters of type bool ['b1'] by a integer representation
-        to match requirements for netCDF attribute data type rules
-        :param attdict: dictionary-like
-        :return:
-        """
-        for key in attdict.keys():
-            content = attdict[key]
-            if type(content) is bool:
-                attdict[key] = int(content)
-
-    @staticmethod
-    def _convert_nonetype_attributes(attdict):
-        """
-        Change empty (None) values in an attrdict to an empty string
-        :param attdict: dictionary like
-        :return: None, will be changed in place
-        """
-        for key in attdict.keys():
-            content = attdict[key]
-            if content is None:
-                attdict[key] = ""
+                var.setncatts(self._get_variable_attr_dict(parameter))
 
     def _get_variable_attr_dict(self, parameter):
         """ Retrieve the parameter attributes """
@@ -764,12 +931,19 @@ class L1bDataNC(DefaultLoggingClass):
 
     def _open_file(self):
         self._rootgrp = Dataset(self.path, "w")
+        self._rootgrp.set_fill_off()
 
     def _write_to_file(self):
         self._rootgrp.close()
 
+    @property
+    def compression_kwargs(self):
+        """ Keywords for netCDF4 variable compression """
+        return dict(zlib=self.zlib, complevel=self.complevel, shuffle=self.shuffle)
+
 
 # FIXME: Is this one used?
+@register_output_class
 class Level1POutput(NCDataFile):
     """ Class to export a l2data object into a netcdf file """
 
@@ -778,6 +952,7 @@ class Level1POutput(NCDataFile):
         self.data = data
 
 
+@register_output_class
 class Level2Output(NCDataFile):
     """
     Class to export a l2data object into a netcdf file
@@ -827,6 +1002,7 @@ class Level2Output(NCDataFile):
         self._write_to_file()
 
 
+@register_output_class
 class Level3Output(NCDataFile):
     """
     Class to export a Level-3 data object into a netcdf file.
@@ -859,7 +1035,7 @@ class Level3Output(NCDataFile):
         rgrp = self._rootgrp
 
         # Set Time Variable
-        var = rgrp.createVariable("time", "f8", ('time', ), zlib=self.zlib)
+        var = rgrp.createVariable("time", "f8", ('time', ), chunksizes=(1, ), **self.compression_kwargs)
         var.standard_name = "time"
         var.units = self.time_def.units
         var.long_name = "Time"
@@ -867,16 +1043,14 @@ class Level3Output(NCDataFile):
         var.calendar = self.time_def.calendar
         var.bounds = "time_bnds"
         var.coverage_content_type = "coordinate"
-        var[:] = date2num(self.data.metadata.time_coverage_start,
-                          self.time_def.units, self.time_def.calendar)
+        var[:] = np.float64(self.time_def.to_num(self.data.metadata.time_coverage_start))
 
         # Set Time Bounds
         rgrp.createDimension("nv", 2)
         time_bounds_dt = self.data.time_bounds
-        td_units, td_cal = self.time_def.units, self.time_def.calendar
-        time_bnds = [[date2num(dt, td_units, td_cal) for dt in time_bounds_dt]]
+        time_bnds = np.array([[self.time_def.to_num(dt) for dt in time_bounds_dt]], dtype=np.float64)
         dims = ("time", "nv")
-        var = rgrp.createVariable("time_bnds", "f8", dims, zlib=self.zlib)
+        var = rgrp.createVariable("time_bnds", "f8", dims, chunksizes=(1, 2), **self.compression_kwargs)
         var.long_name = "Time Bounds"
         var.coverage_content_type = "coordinate"
         var[:] = time_bnds
@@ -904,7 +1078,8 @@ class Level3Output(NCDataFile):
         rgrp = self._rootgrp
 
         # Set x coordinate
-        var = rgrp.createVariable("xc", "f8", ('xc', ), zlib=self.zlib)
+        var = rgrp.createVariable("xc", "f8", ('xc', ), chunksizes=get_chunksizes(rgrp, ('xc', )),
+                                  **self.compression_kwargs)
         var.standard_name = "projection_x_coordinate"
         var.units = "km"
         var.long_name = "x coordinate of projection (eastings)"
@@ -915,7 +1090,8 @@ class Level3Output(NCDataFile):
         yc_km = self.data.griddef.yc_km
         if self.output_handler.flip_yc:
             yc_km = np.flip(yc_km, 0)
-        var = rgrp.createVariable("yc", "f8", ('yc', ), zlib=self.zlib)
+        var = rgrp.createVariable("yc", "f8", ('yc', ), chunksizes=get_chunksizes(rgrp, ('yc', )),
+                                  **self.compression_kwargs)
         var.standard_name = "projection_y_coordinate"
         var.units = "km"
         var.long_name = "y coordinate of projection (northing)"
@@ -927,8 +1103,11 @@ class Level3Output(NCDataFile):
         name = list(grid_nc_cfg.keys())[0]
         attrs = grid_nc_cfg[name]
         var = rgrp.createVariable(name, "i1", ())
-        for key in sorted(attrs.keys()):
-            setattr(var, key, attrs[key])
+        var.setncatts({key: attrs[key] for key in sorted(attrs.keys())})
+        # NOTE: The grid mapping variable only carries attributes, but its value
+        #       needs to be written explicitly since the file is not prefilled.
+        #       The default fill value is the value of prefilled files.
+        var.assignValue(default_fillvals["i1"])
 
 
 class PysiralOutputFilenaming(object):
@@ -954,12 +1133,20 @@ class PysiralOutputFilenaming(object):
             "l2i": "l2i_{version}_{mission_id}_{hemisphere}_{start}_{stop}.nc",
             "l3s": "l3s_{version}_{mission_id}_{grid}_{resolution}_{start}_{stop}.nc"}
 
+        # NOTE: The parsers are compiled only once and are stored with the
+        #       fixed filename prefix of the template for a fast pre-selection
+        self._compiled_parsers = {
+            data_level: (template.partition("{")[0], parse.compile(template))
+            for data_level, template in self._registered_parsers.items()
+        }
+
     def parse_filename(self, fn):
         """ Parse info from pysiral output filename """
         filename = Path(fn).name
         match_found = False
-        for data_level in self._registered_parsers.keys():
-            parser = parse.compile(self._registered_parsers[data_level])
+        for data_level, (prefix, parser) in self._compiled_parsers.items():
+            if not filename.startswith(prefix):
+                continue
             match = parser.parse(filename)
             if match:
                 match_found = True
@@ -983,11 +1170,20 @@ class PysiralOutputFilenaming(object):
         return "{dt:%Y%m%dT%H%M%S}".format(dt=dt)
 
 
+@register_output_class
 class PysiralOutputFolder(object):
     """
     Class for generating and retrieving output folders
     """
 
+    __slots__ = ("error", "data_level", "path", "version", "mission_id", "year", "month", "hemisphere", "config",
+                 "_year_month_subpath")
+
+    # Output folders created by any instance in this process
+    # NOTE: Use `has_created_dir` for lookups, which also checks if
+    #       the folder still exists (e.g. after a cleanup step)
+    _created_dirs = set()
+
     def __init__(self):
         self.error = ErrorStatus()
         self.data_level = None
@@ -998,42 +1194,212 @@ class PysiralOutputFolder(object):
         self.month = None
         self.hemisphere = None
         self.config = psrlcfg
+        self._year_month_subpath = None
 
     def l1bdata_from_list(self, mission_id, version, hemisphere, year, month):
-        self.mission_id = mission_id
-        self.version = version
-        self.hemisphere = hemisphere
+        self.mission_id = sys.intern(mission_id)
+        self.version = sys.intern(version)
+        self.hemisphere = sys.intern(hemisphere)
         self.year = year
         self.month = month
+        self._year_month_subpath = get_year_month_subpath(year, month)
         self._set_folder_as_l1bdata()
 
     def l1bdata_from_l1b(self, l1b, version="default"):
-        self.mission_id = l1b.mission
-        self.version = version
-        self.hemisphere = l1b.info.hemisphere
+        self.mission_id = sys.intern(l1b.mission)
+        self.version = sys.intern(version)
+        self.hemisphere = sys.intern(l1b.info.hemisphere)
         self.year = l1b.info.start_time.year
         self.month = l1b.info.start_time.month
+        self._year_month_subpath = l1b.info.start_time.strftime(os.path.join("%Y", "%m"))
         self._set_folder_as_l1bdata()
 
     def l2i_from_startdt(self, startdt, base_path, subfolders):
-        stringify = {"month": "%02g", "year": "%04g", "day": "%02g"}
-        self.path = base_path
-        for subfolder_tag in subfolders:
-            parameter = getattr(startdt, subfolder_tag)
-            subfolder = stringify[subfolder_tag] % parameter
-            self.path = Path(self.path) / subfolder
+        self.path = get_subfolder_template(tuple(subfolders)).format(base_path, startdt)
 
     def create(self):
-        Path(self.path).mkdir(exist_ok=True, parents=True)
+        # NOTE: Directories created in this process are remembered to
+        #       avoid redundant mkdir calls for files in the same folder
+        path = os.fspath(self.path)
+        if self.has_created_dir(path):
+            return
+        os.makedirs(path, exist_ok=True)
+        self._created_dirs.add(path)
+
+    @classmethod
+    def has_created_dir(cls, path):
+        """
+        Returns True if the folder has been created in this process
+        and still exists.
+
+        :param path: folder path (str)
+
+        :return: flag if folder can be skipped
+        """
+        return path in cls._created_dirs and os.path.isdir(path)
+
+    @classmethod
+    def clear_created_dirs(cls):
+        """
+        Forget all folders created in this process (e.g. for tests or
+        long-running processes that remove output folders)
+
+        :return: None
+        """
+        cls._created_dirs.clear()
+
+    @classmethod
+    def precreate_month_tree(cls, config, mission_id, version, hemisphere, year_months):
+        """
+        Creates all l1bdata output folders of a processing run up-front
+        instead of one by one for each output file. Folders created here
+        are skipped by subsequent calls of `create()`.
+
+        :param config: pysiral package configuration
+        :param mission_id: mission id
+        :param version: l1b repository version
+        :param hemisphere: hemisphere id (north/south)
+        :param year_months: iterable of (year, month) tuples
+
+        :return: sorted list of output folders (str)
+        """
+        export_folder = get_l1bdata_export_folder(config, mission_id, version)
+        paths = sorted({
+            os.path.join(export_folder, hemisphere, get_year_month_subpath(year, month))
+            for year, month in year_months
+        })
+        bulk_create([path for path in paths if not cls.has_created_dir(path)])
+        cls._created_dirs.update(paths)
+        return paths
 
     def _set_folder_as_l1bdata(self):
         self.data_level = "l1b"
-        local_repository = self.config.local_machine.l1b_repository
-        export_folder = local_repository[self.mission_id][self.version].l1bdata
-        yyyy = "{:04g}".format(self.year)
-        mm = "{:02g}".format(self.month)
-        self.path = Path(export_folder) / self.hemisphere / yyyy / mm
+        export_folder = get_l1bdata_export_folder(self.config, self.mission_id, self.version)
+        self.path = os.path.join(export_folder, self.hemisphere, self._year_month_subpath)
+
+    @property
+    def path_obj(self):
+        """ The output folder as pathlib.Path (the path is stored as str) """
+        return None if self.path is None else Path(self.path)
+
+
+class MissionOutputContext(object):
+    """
+    Output folders of the l1bdata repository for a fixed mission, version and
+    hemisphere. Intended for batch processing, where all files share the
+    same mission context and only differ in year and month (see
+    PysiralOutputFolder for single files).
+
+    Usage:
+
+        context = MissionOutputContext(mission_id, version, hemisphere)
+        for l1b in l1b_list:
+            path = context.create(l1b.info.start_time.year, l1b.info.start_time.month)
+    """
+
+    def __init__(self, mission_id, version="default", hemisphere="north", config=None):
+        self.config = psrlcfg if config is None else config
+        self.mission_id = sys.intern(mission_id)
+        self.version = sys.intern(version)
+        self.hemisphere = sys.intern(hemisphere)
+        self.export_folder = get_l1bdata_export_folder(self.config, mission_id, version)
+        self._paths = {}
+
+    def path_for(self, year, month):
+        """
+        Returns the output folder for year and month (str)
+
+        :param year: year (int)
+        :param month: month (int)
+
+        :return: output folder (str)
+        """
+        key = (year, month)
+        if key not in self._paths:
+            self._paths[key] = os.path.join(self.export_folder, self.hemisphere, get_year_month_subpath(year, month))
+        return self._paths[key]
+
+    def create(self, year, month):
+        """
+        Returns the output folder for year and month and creates it
+        if this has not already been done in this process.
+
+        :param year: year (int)
+        :param month: month (int)
+
+        :return: output folder (str)
+        """
+        path = self.path_for(year, month)
+        if not PysiralOutputFolder.has_created_dir(path):
+            os.makedirs(path, exist_ok=True)
+            PysiralOutputFolder._created_dirs.add(path)
+        return path
+
+
+@lru_cache(maxsize=32)
+def get_l1bdata_export_folder(config, mission_id, version):
+    """
+    Returns the l1bdata folder of the local l1b repository for a mission and
+    version. The lookup in the local machine definition is cached, since it
+    is identical for all files of a mission and version.
+
+    :param config: pysiral package configuration
+    :param mission_id: mission id
+    :param version: l1b repository version
+
+    :return: path of the l1bdata folder (str)
+    """
+    local_repository = config.local_machine.l1b_repository
+    return os.fspath(local_repository[mission_id][version].l1bdata)
+
+
+@lru_cache(maxsize=256)
+def get_year_month_subpath(year, month):
+    """
+    Returns the year/month sub-path (e.g. `2020/03`) of an output folder
+
+    :param year: year (int)
+    :param month: month (int)
+
+    :return: sub-path (str)
+    """
+    return os.path.join(f"{year:04d}", f"{month:02d}")
+
+
+def bulk_create(paths, max_workers=16):
+    """
+    Creates a number of independent folders (including parent folders)
+    with a pool of threads. Folder creation is dominated by file system
+    latency (e.g. on network storage), which the threads can overlap.
+
+    :param paths: iterable of folder paths
+    :param max_workers: maximum number of threads
+
+    :return: None
+    """
+    paths = sorted({os.fspath(path) for path in paths})
+    if not paths:
+        return
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(paths))) as executor:
+        # NOTE: Consuming the results re-raises any exception of the workers
+        list(executor.map(partial(os.makedirs, exist_ok=True), paths))
+
+
+@lru_cache(maxsize=32)
+def get_subfolder_template(subfolders):
+    """
+    Returns a format template for a folder with datetime subfolders,
+    e.g. `{0}/{1.year:04d}/{1.month:02d}` for the subfolders
+    ("year", "month"). The template expects the base folder as first and
+    the datetime as second argument.
+
+    :param subfolders: tuple of datetime attribute names
+
+    :return: format template (str)
+    """
+    subfolder_fmts = [f"{{1.{tag}:{'04d' if tag == 'year' else '02d'}}}" for tag in subfolders]
+    return os.path.join("{0}", *subfolder_fmts)
 
 
 def get_output_class(name):
-    return globals()[name]()
+    return OUTPUT_CLASSES[name]()
@@ -6,6 +6,7 @@ Created on Sun Jun 11 19:24:04 2017
 """
 
 
+from functools import lru_cache
 from typing import Any, Tuple, Union
 
 import numpy as np
@@ -35,6 +36,7 @@ class GridDefinition(DefaultLoggingClass):
         self._proj = None
         self._proj_dict = {}
         self._extent_dict = {}
+        self._grid_coordinates = None
 
     def set_from_griddef_file(self, filename):
         """ Initialize the object with a grid definition (.yaml) file.
@@ -50,6 +52,7 @@ class GridDefinition(DefaultLoggingClass):
 
     def set_projection(self, **kwargs):
         self._proj_dict = kwargs
+        self._grid_coordinates = None
         self._set_proj()
 
     def proj(self, longitude, latitude, **kwargs):
@@ -69,19 +72,18 @@ class GridDefinition(DefaultLoggingClass):
         """ Returns longitude/latitude points for each grid cell
         Note: mode keyword only for future use. center coordinates are
         returned by default """
-#        x0, y0 = self.extent.xoff, self.extent.yoff
-#        xsize, ysize = self.extent.xsize, self.extent.ysize
-#        numx, numy = self.extent.numx, self.extent.numy
-#        xmin, xmax = x0-(xsize/2.), x0+(xsize/2.)
-#        ymin, ymax = y0-ysize/2., y0+ysize/2.
-#        x = np.linspace(xmin, xmax, num=numx)
-#        y = np.linspace(ymin, ymax, num=numy)
-        xx, yy = np.meshgrid(self.xc, self.yc)
-        lon, lat = self.proj(xx, yy, inverse=True)
-        return lon, lat
+        # NOTE: The inverse projection of the full grid is computed only once
+        #       and cached until projection or extent change. Copies are returned,
+        #       since callers may modify the arrays.
+        if self._grid_coordinates is None:
+            xx, yy = np.meshgrid(self.xc, self.yc)
+            self._grid_coordinates = self.proj(xx, yy, inverse=True)
+        lon, lat = self._grid_coordinates
+        return np.copy(lon), np.copy(lat)
 
     def set_extent(self, **kwargs):
         self._extent_dict = kwargs
+        self._grid_coordinates = None
 
     def _set_proj(self):
         self._proj = Proj(**self._proj_dict)
@@ -228,10 +230,15 @@ class GridTrajectoryExtract(object):
         self.griddef = AttrDict(**griddef)
 
         # Compute image coordinates
-        self.p = Proj(**self.griddef.projection)
-        self.ix, self.iy = self._get_track_image_coordinates()
-
-    def _get_track_image_coordinates(self) -> Tuple[npt.NDArray, npt.NDArray]:
+        # NOTE: The image coordinates are stored as a single (2, n) array in
+        #       the order expected by scipy.ndimage.map_coordinates, which can be
+        #       reused for all grid variables. `iy` and `ix` are views on this array.
+        self.p = get_cached_proj(**self.griddef.projection)
+        self.image_coordinates = self._get_track_image_coordinates()
+        self._clipped_image_coordinates = {}
+        self.iy, self.ix = self.image_coordinates
+
+    def _get_track_image_coordinates(self) -> npt.NDArray:
         """
         Computes and returns the image coordinates, by converting the
         trajectory lon/lat values to projection coordinates and
@@ -239,12 +246,19 @@ class GridTrajectoryExtract(object):
 
         :raises: None
 
-        :return: image x coordindate, image y coordinate
+        :return: image coordinates [image y coordinate, image x coordinate] with shape (2, n)
         """
         tr_x, tr_y = self.p(self.trajectory_longitude, self.trajectory_latitude)
-        dim = self.griddef.dimension
-        x_min, y_max = -0.5 * dim.dx * (dim.n_cols - 1), 0.5 * dim.dy * (dim.n_lines - 1)
-        return (tr_x - x_min) / dim.dx, (y_max - tr_y) / dim.dy
+        x_min, y_max, inv_dx, inv_dy = get_image_transform(**self.griddef.dimension)
+
+        # NOTE: The image coordinates are computed directly into the
+        #       coordinate array to avoid temporary arrays
+        image_coordinates = np.empty((2, np.size(tr_x)), dtype=float)
+        np.subtract(y_max, tr_y, out=image_coordinates[0])
+        image_coordinates[0] *= inv_dy
+        np.subtract(tr_x, x_min, out=image_coordinates[1])
+        image_coordinates[1] *= inv_dx
+        return image_coordinates
 
     def get_from_grid_variable(self,
                                grid_var: npt.NDArray,
@@ -267,41 +281,95 @@ class GridTrajectoryExtract(object):
         :return: The grid variable extracted and interpolation for the trajectory location
         """
         grid_var = np.flipud(grid_var) if flipud else grid_var
-        return ndimage.map_coordinates(grid_var,
-                                       [self.iy, self.ix],
-                                       order=order,
-                                       mode="constant",
-                                       cval=outside_value
-                                       )
-
-# TODO: Add automatic debug map
-# import matplotlib.pyplot as plt
-# import cartopy.crs as ccrs
-# import cartopy.feature as cfeature
-#
-# fig = plt.figure(dpi=150)
-# cmap_kwargs = {
-#     "cmap": plt.get_cmap("plasma"),
-#     "vmin": 0,
-#     "vmax": 20
-# }
-# proj = ccrs.LambertAzimuthalEqualArea(central_latitude=90)
-# ax = fig.add_subplot(1, 1, 1, projection=proj)
-# ax.add_feature(cfeature.COASTLINE)
-# ax.add_feature(cfeature.OCEAN)
-# ax.add_feature(cfeature.LAND)
-# ax.imshow(self.nc.region_id.values,
-#           transform=proj,
-#           extent=[-5400000, 5400000, -5400000, 5400000],
-#           origin="lower",
-#           **cmap_kwargs)
-# ax.scatter(
-#     l2.longitude,
-#     l2.latitude,
-#     c=region_code,
-#     edgecolors="white",
-#     transform=ccrs.PlateCarree(),
-#     **cmap_kwargs
-# )
-# ax.set_extent([-180, 180, 45, 90], ccrs.PlateCarree())
-# plt.show()
+
+        # NOTE: Spline interpolation (order > 1) depends on the boundary mode
+        #       and is therefore only available with the constant mode. The
+        #       constant mode is also used for non-floating point grids, since
+        #       map_coordinates casts (and rounds) `outside_value` to the grid
+        #       type, which cannot be reproduced by assignment (e.g. for NaN).
+        if order > 1 or not np.issubdtype(grid_var.dtype, np.inexact):
+            return ndimage.map_coordinates(grid_var,
+                                           self.image_coordinates,
+                                           order=order,
+                                           mode="constant",
+                                           cval=outside_value
+                                           )
+
+        # NOTE: For nearest neighbour and linear interpolation, out of bounds
+        #       positions are set after the interpolation with clipped image
+        #       coordinates, which avoids the per-sample boundary handling of
+        #       the constant mode.
+        image_coordinates, out_of_bounds = self._get_clipped_image_coordinates(np.shape(grid_var))
+        grid_var_trajectory = ndimage.map_coordinates(grid_var,
+                                                      image_coordinates,
+                                                      order=order,
+                                                      mode="nearest"
+                                                      )
+        grid_var_trajectory[out_of_bounds] = outside_value
+        return grid_var_trajectory
+
+    def _get_clipped_image_coordinates(self, grid_shape: Tuple[int, ...]) -> Tuple[npt.NDArray, npt.NDArray]:
+        """
+        Returns the image coordinates clipped to a grid shape and the flag
+        which positions are outside the grid. The result is cached for
+        extraction of several variables from the same grid.
+
+        :param grid_shape: shape of the grid variable (n_lines, n_cols)
+
+        :return: clipped image coordinates, out of bounds flag
+        """
+        grid_shape = tuple(grid_shape)
+        if grid_shape not in self._clipped_image_coordinates:
+            iy, ix = self.image_coordinates
+            n_lines, n_cols = grid_shape
+            out_of_bounds = ~np.isfinite(iy) | ~np.isfinite(ix)
+            out_of_bounds |= (iy < 0) | (iy > n_lines - 1) | (ix < 0) | (ix > n_cols - 1)
+            image_coordinates = np.nan_to_num(self.image_coordinates)
+            np.clip(image_coordinates[0], 0, n_lines - 1, out=image_coordinates[0])
+            np.clip(image_coordinates[1], 0, n_cols - 1, out=image_coordinates[1])
+            self._clipped_image_coordinates[grid_shape] = image_coordinates, out_of_bounds
+        return self._clipped_image_coordinates[grid_shape]
+
+
+@lru_cache(maxsize=16)
+def _get_proj(projection_items: Tuple[Tuple[str, Any], ...]) -> Proj:
+    return Proj(**dict(projection_items))
+
+
+def get_cached_proj(**projection: Any) -> Proj:
+    """
+    Returns a pyproj.Proj instance for the projection keywords. Instances
+    are cached for (hashable) projection definitions, since the same grid
+    projection is used for all trajectories in a processor run.
+
+    :param projection: keywords for pyproj.Proj
+
+    :return: pyproj.Proj instance
+    """
+    projection_items = tuple(sorted(projection.items()))
+    try:
+        return _get_proj(projection_items)
+    except TypeError:
+        return Proj(**projection)
+
+
+def get_image_transform(dx: float = None,
+                        dy: float = None,
+                        n_cols: int = None,
+                        n_lines: int = None,
+                        **_: Any
+                        ) -> Tuple[float, float, float, float]:
+    """
+    Returns the constants for the transformation of projection coordinates
+    to image coordinates of a grid given by its dimension dictionary (see
+    GridTrajectoryExtract).
+
+    :param dx: grid spacing in x direction
+    :param dy: grid spacing in y direction
+    :param n_cols: number of grid columns
+    :param n_lines: number of grid lines
+
+    :return: x_min, y_max, 1/dx, 1/dy
+    """
+    x_min, y_max = -0.5 * dx * (n_cols - 1), 0.5 * dy * (n_lines - 1)
+    return x_min, y_max, 1.0 / dx, 1.0 / dy
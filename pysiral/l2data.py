@@ -15,6 +15,7 @@ from datetime import datetime
 import numpy as np
 from geopy.distance import great_circle
 from loguru import logger
+from pyproj import Proj
 
 from pysiral import psrlcfg
 from pysiral.core import DefaultLoggingClass
@@ -815,20 +816,74 @@ class L2DataArray(np.ndarray):
 
 class Level2PContainer(DefaultLoggingClass):
 
-    def __init__(self, period):
+    def __init__(self, period, valid_mask="sea_ice_freeboard"):
+        """
+        Container for merging the valid data points of several l2i objects.
+        Only the valid subset of the l2i variables (see `valid_mask`) is kept
+        when an l2i object is added, the l2i objects themselves are not
+        stored.
+
+        :param period: The data period of the l2p product
+        :param valid_mask: The name of the parameter that defines the
+            mask of valid l2i data points (None: all data points are valid)
+        """
         super(Level2PContainer, self).__init__(self.__class__.__name__)
         self.error = ErrorStatus()
         self._period = period
-        self._l2i_stack = []
+        self._valid_mask = valid_mask
+        self._n_l2i_objects = 0
+
+        # Metadata and parameter list of the first l2i object
+        # (assumed to be identical for all files in the stack)
+        self._l2i_info = None
+        self._parameter_list = None
+
+        # The valid subsets of all l2i objects per parameter
+        self._data_chunks = {}
+
+        # Variables that are dimensions and not data variables
+        self._dimension_data = {}
 
     def append_l2i(self, l2i):
-        self._l2i_stack.append(l2i)
+        """
+        Add the valid data points of an l2i object to the container
+
+        :param l2i: pysiral.l2data.L2iNCFileImport instance
+        """
+
+        # The first l2i object defines the metadata and parameter list
+        if self._l2i_info is None:
+            self._l2i_info = l2i.info
+            self._parameter_list = list(l2i.parameter_list)
+            self._data_chunks = {parameter_name: [] for parameter_name in self._parameter_list}
+
+        if self._valid_mask is not None:
+            is_valid = np.isfinite(getattr(l2i, self._valid_mask))
+        else:
+            is_valid = slice(None)
+
+        for parameter in self._parameter_list:
+            stack_data = getattr(l2i, parameter)
+
+            # TODO: This needs better handling
+            # NOTE: Some variables are dimensions and not data variables.
+            #       These should not be concatenated
+            if stack_data.size == l2i.n_records:
+                self._data_chunks[parameter].append(stack_data[is_valid])
+            else:
+                self._dimension_data[parameter] = stack_data
+
+        self._n_l2i_objects += 1
 
     def get_merged_l2(self):
         """ Returns a Level2Data object with data from all l2i objects """
 
+        # No l2i object could be added to the container
+        if self._l2i_info is None:
+            return None
+
         # Merge the parameter
-        data = self._get_merged_data(valid_mask="sea_ice_freeboard")
+        data = self._get_merged_data()
 
         # There are rare occasion, where no valid freeboard data is found for an entire day
         if len(data["longitude"]) == 0:
@@ -838,9 +893,6 @@ class Level2PContainer(DefaultLoggingClass):
         timeorbit = Level2iTimeOrbit()
         timeorbit.from_l2i_stack(data)
 
-        # Use the first l2i object in stack to retrieve metadata
-        l2i = self._l2i_stack[0]
-
         # Set up a metadata container
         metadata = Level2iMetadata()
         metadata.set_attribute("n_records", len(timeorbit.time))
@@ -855,26 +907,26 @@ class Level2PContainer(DefaultLoggingClass):
 
         # Retrieve the following constant attributes from the first
         # l2i object in the stack
-        info = self.l2i_stack[0].info
+        info = self._l2i_info
 
         # Old notation (for backward compatibility)
         # TODO: This will soon be obsolete
         mission_id = None
         if hasattr(info, "mission_id"):
             mission_id = info.mission_id
-            metadata.source_auxdata_sic = l2i.info.source_sic
-            metadata.source_auxdata_snow = l2i.info.source_snow
-            metadata.source_auxdata_sitype = l2i.info.source_sitype
-            metadata.source_auxdata_mss = l2i.info.source_mss
+            metadata.source_auxdata_sic = info.source_sic
+            metadata.source_auxdata_snow = info.source_snow
+            metadata.source_auxdata_sitype = info.source_sitype
+            metadata.source_auxdata_mss = info.source_mss
 
         # New (fall 2017) pysiral product notation
         if hasattr(info, "source_mission_id"):
             mission_id = info.source_mission_id
             # Transfer auxdata information
-            metadata.source_auxdata_sic = l2i.info.source_auxdata_sic
-            metadata.source_auxdata_snow = l2i.info.source_auxdata_snow
-            metadata.source_auxdata_sitype = l2i.info.source_auxdata_sitype
-            metadata.source_auxdata_mss = l2i.info.source_auxdata_mss
+            metadata.source_auxdata_sic = info.source_auxdata_sic
+            metadata.source_auxdata_snow = info.source_auxdata_snow
+            metadata.source_auxdata_sitype = info.source_auxdata_sitype
+            metadata.source_auxdata_mss = info.source_auxdata_mss
 
         # Conversion of l2i to CF/ACDD conventions (Fall 2021)
         if hasattr(info, "platform"):
@@ -884,11 +936,11 @@ class Level2PContainer(DefaultLoggingClass):
             self.error.add_error("unknown-platform", "Cannot determine platform name from source l2i stack")
             self.error.raise_on_error()
 
-        if hasattr(l2i.info, "source_timeliness"):
-            metadata.timeliness = l2i.info.source_timeliness
+        if hasattr(info, "source_timeliness"):
+            metadata.timeliness = info.source_timeliness
 
-        if hasattr(l2i.info, "data_record_type"):
-            metadata.timeliness = l2i.info.data_record_type
+        if hasattr(info, "data_record_type"):
+            metadata.timeliness = info.data_record_type
 
         metadata.set_attribute("mission", mission_id)
         mission_sensor = psrlcfg.platforms.get_sensor(mission_id)
@@ -901,7 +953,7 @@ class Level2PContainer(DefaultLoggingClass):
 
         # 1. Get the list of parameters
         # (assuming all l2i files share the same)
-        parameter_list_all = l2i.parameter_list
+        parameter_list_all = self._parameter_list
 
         # 2. Exclude variables that end with `_uncertainty`
         parameter_list = [p for p in parameter_list_all if not re.search("_uncertainty", p)]
@@ -931,48 +983,27 @@ class Level2PContainer(DefaultLoggingClass):
 
         return l2
 
-    def _get_merged_data(self, valid_mask: str = None) -> dict:
+    def _get_merged_data(self) -> dict:
         """
         Returns a dict with merged data groups for all parameters
         in the l2i file (assumed to be identical for all files in the stack)
 
-        :param valid_mask: The name of the parameter that defines the
-            mask of valid l2i data points
-
         :return: Dictionary with all mergered l2i parameters
         """
-        parameter_list = self.l2i_stack[0].parameter_list
-        data = self._get_empty_data_group(parameter_list)
-        for l2i in self.l2i_stack:
-            if valid_mask is not None:
-                valid_mask_parameter = getattr(l2i, valid_mask)
-                is_valid = np.where(np.isfinite(valid_mask_parameter))[0]
-            else:
-                is_valid = np.arange(l2i.n_records)
-            for parameter in parameter_list:
-                stack_data = getattr(l2i, parameter)
-
-                # TODO: This needs better handling
-                # NOTE: Some variables are dimensions and not data variables.
-                #       These should not be concatenated
-                if stack_data.size == l2i.n_records:
-                    stack_data = stack_data[is_valid]
-                    data[parameter] = np.append(data[parameter], stack_data)
-                else:
-                    data[parameter] = stack_data
+        data = {}
+        for parameter, chunks in self._data_chunks.items():
+            if parameter in self._dimension_data:
+                data[parameter] = self._dimension_data[parameter]
+                continue
+            # NOTE: The empty float32 array is kept as first element to
+            #       retain the dtype promotion of the previous implementation
+            #       (stepwise np.append on an empty float32 array)
+            data[parameter] = np.concatenate([np.array([], dtype=np.float32)] + chunks)
         return data
 
-    @staticmethod
-    def _get_empty_data_group(parameter_list):
-        return {parameter_name: np.array([], dtype=np.float32) for parameter_name in parameter_list}
-
-    @property
-    def l2i_stack(self):
-        return self._l2i_stack
-
     @property
     def n_l2i_objects(self):
-        return len(self.l2i_stack)
+        return self._n_l2i_objects
 
     @property
     def period(self):
@@ -997,6 +1028,7 @@ class L2iNCFileImport(object):
         self._n_records = 0
         self.time_def = NCDateNumDef()
         self.info = AttributeList()
+        self._mission = None
         self.attribute_list = []
         self.parameter_list = []
         self._parse()
@@ -1042,7 +1074,6 @@ class L2iNCFileImport(object):
 
     # TODO: Does this need to be here?
     def project(self, griddef):
-        from pyproj import Proj
         p = Proj(**griddef.projection)
         self.projx, self.projy = p(self.longitude, self.latitude)
         # Convert projection coordinates to grid indices
@@ -1056,18 +1087,34 @@ class L2iNCFileImport(object):
 
     @property
     def mission(self):
+        # NOTE: The metadata does not change after parsing the file,
+        #       therefore the mission id is only resolved once
+        if self._mission is None:
+            self._mission = self._get_mission()
+        return self._mission
+
+    def _get_mission(self):
+        """
+        Resolve the mission id from the global attributes of the l2i file.
+        Attributes are checked in the order `mission_id`, `source_mission_id`
+        and `platform`.
+
+        :return: mission id or None
+        """
 
         if not hasattr(self, "info"):
             return None
 
-        if hasattr(self.info, "mission_id"):
-            return self.info.mission_id
+        mission_id = getattr(self.info, "mission_id", None)
+        if mission_id is not None:
+            return mission_id
 
-        if hasattr(self.info, "source_mission_id"):
-            return self.info.source_mission_id
+        mission_id = getattr(self.info, "source_mission_id", None)
+        if mission_id is not None:
+            return mission_id
 
-        if hasattr(self.info, "platform"):
-            platform_name = self.info.platform
+        platform_name = getattr(self.info, "platform", None)
+        if platform_name is not None:
             return psrlcfg.platforms.get_platform_id(platform_name)
 
         return None
@@ -1078,10 +1125,8 @@ class L2iNCFileImport(object):
         if not hasattr(self, "info"):
             return "unknown"
 
-        if hasattr(self.info, "source_mission_id"):
-            return self.info.source_mission_id
-
-        if hasattr(self.info, "data_record_type"):
-            return self.info.data_record_type
+        timeliness = getattr(self.info, "source_timeliness", None)
+        if timeliness is not None:
+            return timeliness
 
-        return "unknown"
+        return getattr(self.info, "data_record_type", "unknown")
@@ -6,7 +6,9 @@ Created on Fri Aug 11 17:07:02 2017
 """
 
 
+import multiprocessing
 from collections import OrderedDict
+from functools import cached_property
 from pathlib import Path
 
 from loguru import logger
@@ -39,14 +41,10 @@ class Level2PreProcessor(DefaultLoggingClass):
         l2p = Level2PContainer(period)
 
         # Add all l2i objects to the l2p container.
-        # NOTE: Only memory is the limit
-        for l2i_file in l2i_files:
-            try:
-                l2i = L2iNCFileImport(l2i_file)
-            except Exception as ex:
-                msg = "Error (%s) in l2i file: %s"
-                msg %= (ex, Path(l2i_file).name)
-                logger.error(msg)
+        # NOTE: The container only keeps the valid data points of
+        #       each l2i object and not the l2i object itself
+        for l2i in self._read_l2i_files(l2i_files):
+            if l2i is None:
                 continue
             l2p.append_l2i(l2i)
 
@@ -60,11 +58,53 @@ class Level2PreProcessor(DefaultLoggingClass):
         output = Level2Output(l2, self.job.output_handler)
         logger.info(f"- Wrote {self.job.output_handler.id} data file: {output.export_filename}")
 
+    @staticmethod
+    def _read_l2i_files(l2i_files):
+        """
+        Generator for reading l2i files. The files are read in parallel
+        by a pool of worker processes (number of processes defined by the
+        pysiral package configuration), but are returned in the order
+        of the input list.
+
+        :param l2i_files: list of l2i file paths
+
+        :return: generator of L2iNCFileImport instances (None if file could not be read)
+        """
+        n_processes = min(psrlcfg.CPU_COUNT, len(l2i_files))
+        if n_processes <= 1:
+            for l2i_file in l2i_files:
+                yield read_l2i_file(l2i_file)
+            return
+
+        with multiprocessing.Pool(n_processes) as process_pool:
+            yield from process_pool.imap(read_l2i_file, l2i_files)
+
     @property
     def job(self):
         return self._job
 
 
+def read_l2i_file(l2i_file):
+    """
+    Read a l2i file and return the content. Errors are logged but
+    not raised.
+
+    NOTE: This is a module level function to be usable by a
+          multiprocessing pool.
+
+    :param l2i_file: path to l2i file
+
+    :return: L2iNCFileImport instance or None if the file could not be read
+    """
+    try:
+        return L2iNCFileImport(l2i_file)
+    except Exception as ex:
+        msg = "Error (%s) in l2i file: %s"
+        msg %= (ex, Path(l2i_file).name)
+        logger.error(msg)
+        return None
+
+
 class Level2PreProcProductDefinition(DefaultLoggingClass):
 
     def __init__(self):
@@ -162,9 +202,10 @@ class Level2POutputHandler(OutputHandlerBase):
 
     def get_global_attribute_dict(self, l2):
         attr_dict = OrderedDict()
+        attribute_cache = {}
         for attr_entry in self.output_def.global_attributes:
             attr_name, attr_template = zip(*attr_entry.items())
-            attribute = self.fill_template_string(attr_template[0], l2)
+            attribute = self.fill_template_string(attr_template[0], l2, cache=attribute_cache)
             attr_dict[attr_name[0]] = attribute
         return attr_dict
 
@@ -195,7 +236,7 @@ class Level2POutputHandler(OutputHandlerBase):
     def doi(self):
         return self._doi
 
-    @property
+    @cached_property
     def default_output_def_filename(self):
         local_settings_path = psrlcfg.pysiral_local_path
         return Path(local_settings_path) / Path(*self.default_file_location)
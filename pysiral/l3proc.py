@@ -174,8 +174,10 @@ class Level3Processor(DefaultLoggingClass):
         if flag_miz is None:
             return
 
-        idx = np.where(flag_miz >= miz_filter["mask_min_value"])[0]
-        l2i.mask_variables(idx, miz_filter["mask_targets"])
+        # NOTE: The boolean mask is used directly for masking, which
+        #       avoids the allocation of an intermediate index array
+        miz_mask = flag_miz >= miz_filter["mask_min_value"]
+        l2i.mask_variables(miz_mask, miz_filter["mask_targets"])
 
     def _apply_processing_items(self, l3grid):
         """
@@ -902,9 +904,10 @@ class Level3OutputHandler(OutputHandlerBase):
 
     def get_global_attribute_dict(self, l3):
         attr_dict = OrderedDict()
+        attribute_cache = {}
         for attr_entry in self.output_def.global_attributes:
             attr_name, attr_template = zip(*attr_entry.items())
-            attribute = self.fill_template_string(attr_template[0], l3)
+            attribute = self.fill_template_string(attr_template[0], l3, cache=attribute_cache)
             attr_dict[attr_name[0]] = attribute
         return attr_dict
 
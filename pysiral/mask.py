@@ -7,15 +7,11 @@ Created on Thu Sep 28 14:00:52 2017
 @author: shendric
 """
 
-import contextlib
-import struct
-from collections import OrderedDict
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, Tuple, Union
 
 import numpy as np
 import numpy.typing as npt
-import xarray as xr
 from loguru import logger
 from netCDF4 import Dataset
 from pyresample import geometry, image, kd_tree
@@ -29,6 +25,14 @@ from pysiral.grid import GridDefinition, GridTrajectoryExtract
 from pysiral.l1data import Level1bData
 from pysiral.l1preproc.procitems import L1PProcItem
 
+# Cache of high resolution land mask grids (key: file path, fill value)
+_HIGH_RESOLUTION_LAND_MASK_CACHE = {}
+
+# Land/ocean flag value for masked (missing) grid cells of the high resolution
+# land mask. The value must differ from the dummy (outside grid) value and from
+# the valid flag values (0: ocean, 1: land) to result in the invalid surface type.
+HR_LAND_OCEAN_FLAG_MISSING_VALUE = -2
+
 
 def MaskSourceFile(mask_name, mask_cfg):
     """ Wrapper method for different mask source file classes """
@@ -64,6 +68,7 @@ class MaskSourceBase(DefaultLoggingClass):
         self._mask = None
         self._area_def = None
         self._post_flipud = False
+        self._neighbour_info = {}
 
     def set_mask(self, mask, area_def):
         """ Set grid definition for the mask source grid using pyresample.
@@ -73,6 +78,7 @@ class MaskSourceBase(DefaultLoggingClass):
 
         # Set the Mask
         self._mask = mask
+        self._neighbour_info = {}
 
         # Set the area definition
         pyresample_instances = (geometry.AreaDefinition, geometry.GridDefinition)
@@ -89,6 +95,22 @@ class MaskSourceBase(DefaultLoggingClass):
         The argument griddef is needs to be a pysiral.grid.GridDefinition
         instance """
 
+        target_mask = self.get_l3_mask(griddef)
+
+        # Write the mask to a netCDF file
+        # (the filename will be automatically generated if not specifically
+        # passed to this method
+        if nc_filepath is None:
+            nc_filename = f"{self.mask_name}_{griddef.grid_id}.nc"
+            nc_filepath = Path(self.mask_dir) / nc_filename
+        logger.info(f"Export mask file: {nc_filepath}")
+        self._write_netcdf(nc_filepath, griddef, target_mask)
+
+    def get_l3_mask(self, griddef):
+        """ Resample the source mask to a Level-3 grid (incl. optional
+        post-processing). The argument griddef is needs to be a
+        pysiral.grid.GridDefinition instance """
+
         # Get the area definition for the grid
         if not isinstance(griddef, GridDefinition):
             msg = "griddef needs to be of type pysiral.grid.GridDefinition"
@@ -103,12 +125,7 @@ class MaskSourceBase(DefaultLoggingClass):
             target_mask = resample_result.image_data
 
         elif self.cfg.pyresample_method == "resample_gauss":
-
-            result, stddev, count = kd_tree.resample_gauss(
-                    self.source_area_def, self.source_mask,
-                    griddef.pyresample_area_def, with_uncert=True,
-                    **self.cfg.pyresample_keyw)
-            target_mask = result
+            target_mask = self._resample_gauss(griddef, **self.cfg.pyresample_keyw)
 
         else:
             msg = f"Unrecognized opt pyresample_method: {str(self.cfg.pyresample_method)} need to be (" \
@@ -117,34 +134,66 @@ class MaskSourceBase(DefaultLoggingClass):
             self.error.add_error("invalid-pr-method", msg)
             self.error.add_error()
 
-        # pyresample may use masked arrays -> set nan's to missing data
-        with contextlib.suppress(AttributeError):
-            target_mask[np.where(target_mask.mask)] = np.nan
+        # pyresample may use masked arrays -> set missing data to nan
+        # (or -1 for integer masks)
+        if np.ma.isMaskedArray(target_mask):
+            fill_value = np.nan if target_mask.dtype.kind == "f" else -1
+            target_mask = target_mask.filled(fill_value=fill_value)
 
         if "post_processing" in self.cfg:
             pp_method = getattr(self, self.cfg.post_processing)
             target_mask = pp_method(target_mask, griddef)
 
-        # Write the mask to a netCDF file
-        # (the filename will be automatically generated if not specifically
-        # passed to this method
-        if nc_filepath is None:
-            nc_filename = f"{self.mask_name}_{griddef.grid_id}.nc"
-            nc_filepath = Path(self.mask_dir) / nc_filename
-        logger.info(f"Export mask file: {nc_filepath}")
-        self._write_netcdf(nc_filepath, griddef, target_mask)
+        return target_mask
+
+    def _resample_gauss(self, griddef, radius_of_influence, sigmas,
+                        neighbours=8, epsilon=0, fill_value=0, reduce_data=True,
+                        nprocs=None, segments=None, with_uncert=False):
+        """
+        Gaussian weighted kd-tree resampling of the source mask to a target grid
+        (equivalent to pyresample.kd_tree.resample_gauss). The neighbour information
+        for a target grid is cached, since building the kd-tree dominates the
+        resampling time and does not depend on the source mask values.
+
+        :param griddef: pysiral.grid.GridDefinition of the target grid
+        :param radius_of_influence: Cut off distance in meters
+        :param sigmas: Sigma of the gauss weighting function
+        :param neighbours: Number of neighbours per target grid cell
+        :param epsilon: Allowed uncertainty in meters
+        :param fill_value: Value for target grid cells without neighbours
+        :param reduce_data: Flag if source data is reduced to the target area
+        :param nprocs: Number of processes for the kd-tree query
+            (default: pysiral CPU count)
+        :param segments: Number of segments for the kd-tree query
+        :param with_uncert: Not used (only accepted for compatibility with the keywords
+            of pyresample.kd_tree.resample_gauss, the uncertainty is not computed)
+
+        :return: resampled mask
+        """
+        target_area_def = griddef.pyresample_area_def
+        nprocs = psrlcfg.CPU_COUNT if nprocs is None else nprocs
+        cache_key = (griddef.grid_id, target_area_def.shape, radius_of_influence,
+                     neighbours, epsilon, reduce_data, segments)
+        if cache_key not in self._neighbour_info:
+            self._neighbour_info[cache_key] = kd_tree.get_neighbour_info(
+                self.source_area_def, target_area_def, radius_of_influence,
+                neighbours=neighbours, epsilon=epsilon, reduce_data=reduce_data,
+                nprocs=nprocs, segments=segments)
+        valid_input_index, valid_output_index, index_array, distance_array = self._neighbour_info[cache_key]
+
+        def gauss(r):
+            return np.exp(-r ** 2 / float(sigmas) ** 2)
+
+        return kd_tree.get_sample_from_neighbour_info(
+            "custom", target_area_def.shape, self.source_mask,
+            valid_input_index, valid_output_index, index_array,
+            distance_array=distance_array, weight_funcs=gauss,
+            fill_value=fill_value)
 
     def _write_netcdf(self, nc_filepath, griddef, mask):
         """ Write a netCDF file with the mask in the target
         grid projections"""
 
-        # Get metadata
-        shape = np.shape(mask)
-        dimdict = OrderedDict([("x", shape[0]), ("y", shape[1])])
-
-        # Get longitude/latitude from grid definition
-        lons, lats = griddef.get_grid_coordinates()
-
         # Open the file
         try:
             rootgrp = Dataset(nc_filepath, "w")
@@ -161,33 +210,8 @@ class MaskSourceBase(DefaultLoggingClass):
         rootgrp.setncattr("description", self.cfg.label)
         rootgrp.setncattr("grid_id", griddef.grid_id)
 
-        # Write dimensions
-        dims = dimdict.keys()
-        for key in dims:
-            rootgrp.createDimension(key, dimdict[key])
-
-        # Write Variables
-        dim = tuple(dims[:len(mask.shape)])
-        dtype_str = mask.dtype.str
-        varmask = rootgrp.createVariable("mask", dtype_str, dim, zlib=True)
-        varmask[:] = mask
-
-        dtype_str = lons.dtype.str
-        varlon = rootgrp.createVariable("longitude", dtype_str, dim, zlib=True)
-        setattr(varlon, "long_name", "longitude of grid cell center")
-        setattr(varlon, "standard_name", "longitude")
-        setattr(varlon, "units", "degrees")
-        setattr(varlon, "scale_factor", 1.0)
-        setattr(varlon, "add_offset", 0.0)
-        varlon[:] = lons
-
-        varlat = rootgrp.createVariable("latitude", dtype_str, dim, zlib=True)
-        setattr(varlat, "long_name", "latitude of grid cell center")
-        setattr(varlat, "standard_name", "latitude")
-        setattr(varlat, "units", "degrees")
-        setattr(varlat, "scale_factor", 1.0)
-        setattr(varlat, "add_offset", 0.0)
-        varlat[:] = lats
+        # Write dimensions & variables
+        write_l3_mask_variables(rootgrp, griddef, {"mask": mask})
 
         # Close the file
         rootgrp.close()
@@ -228,29 +252,31 @@ class MaskLandSea2Min(MaskSourceBase):
 
         # Settings for the binary file
         xdim, ydim = 10800, 5400
-        mask_struct_fmt = "<%0.fB" % (xdim * ydim)
         n_bytes_header = 1392
 
-        # Read the content of the landmask in a string
-        with open(str(self.mask_filepath), "rb") as fh:
-            # Skip header
-            fh.seek(n_bytes_header)
-            content = fh.read(xdim*ydim)
-
-        # decode string & order to array
-        mask_val = np.array(struct.unpack(mask_struct_fmt, content))
-        mask = mask_val.reshape((xdim, ydim))
-        mask = mask.transpose()
+        # Map the content of the landmask (after the header) to an array
+        # NOTE: The memory map is served directly from the page cache and
+        #       transpose only returns a view. The only copy of the data is
+        #       the land/sea flag below.
+        mask_val = np.memmap(self.mask_filepath, dtype=np.uint8, mode="r",
+                             offset=n_bytes_header, shape=(xdim, ydim))
+        mask = mask_val.transpose()
 
         # Convert to only land/sea flag
         # Note: mask must be a byte data type since netCDF does not handle
         #       variables of type bool very well
         mask = np.int8(mask > 0)
+        del mask_val
 
         # Compute longitude/latitude grids
-        lons_1d = np.linspace(0., 360., xdim)
-        lats_1d = np.linspace(-90, 90, ydim)
-        lons, lats = np.meshgrid(lons_1d, lats_1d)
+        # NOTE: The 2D grids are read-only broadcasted views of the 1D coordinates,
+        #       which avoids allocating two full (ydim, xdim) float64 arrays
+        #       Longitude is periodic, the 360 degree endpoint is excluded
+        #       to get the correct 2-minute spacing without a duplicate meridian.
+        lons_1d = np.linspace(0., 360., xdim, endpoint=False, dtype=np.float32)
+        lats_1d = np.linspace(-90., 90., ydim, dtype=np.float32)
+        lons = np.broadcast_to(lons_1d, (ydim, xdim))
+        lats = np.broadcast_to(lats_1d[:, np.newaxis], (ydim, xdim))
 
         # Create geometry definitions
         area_def = geometry.GridDefinition(lons=lons, lats=lats)
@@ -264,17 +290,16 @@ class MaskLandSea2Min(MaskSourceBase):
         The resampled mask contains a land fraction (datatype float), which
         needs to be simplified to the flags (0: ocean, 1: mixed, 2: land) """
 
-        # Input array is range [0:1], scale to [0:2]
-        pp_mask = np.copy(resampled_mask*2)
-
-        # Get indices that are neither 0 or 2 and set them to mixed flag
-        is_not_sea = np.logical_not(np.isclose(pp_mask, 0.))
-        is_not_land = np.logical_not(np.isclose(pp_mask, 2.))
-        is_mixed = np.logical_and(is_not_sea, is_not_land)
-        pp_mask[np.where(is_mixed)] = 1.
+        # Input array is range [0:1]. All grid cells are initialized with
+        # the mixed flag and only pure ocean and land cells are updated
+        # (NaN's will remain mixed).
+        eps = 1.0e-8
+        pp_mask = np.ones(np.shape(resampled_mask), dtype=np.int8)
+        pp_mask[resampled_mask <= eps] = 0
+        pp_mask[resampled_mask >= 1.0 - eps] = 2
 
         # Return as byte array (also needs to be flipped)
-        return np.flipud(pp_mask.astype(np.int8))
+        return np.flipud(pp_mask)
 
     @property
     def mask_filepath(self):
@@ -305,14 +330,14 @@ class MaskW99Valid(MaskSourceBase):
         # Get longitude/latitude valies for target grid
         lons, lats = griddef.get_grid_coordinates()
 
+        # Set all NaN's to 0 (in-place)
+        np.nan_to_num(resampled_mask, copy=False, nan=0.0)
+
         # Set mask to false for all grid cells south of 65N
-        resampled_mask[np.where(lats <= 65.)] = 0
+        resampled_mask[lats <= 65.] = 0
 
         # Fix north pole issue
-        resampled_mask[np.where(lats >= 89.)] = 1
-
-        # Set all NaN's to 0
-        resampled_mask[np.where(np.isnan(resampled_mask))] = 0
+        resampled_mask[lats >= 89.] = 1
 
         # Done
         return resampled_mask
@@ -343,30 +368,27 @@ class L3Mask(DefaultLoggingClass):
         self._read_mask_netcdf()
 
     def _read_mask_netcdf(self):
-        """ Read the mask """
-        if self.mask_filepath is not None:
-            self._nc = ReadNC(self.mask_filepath)
+        """ Read the mask and keep the (optionally flipped) variables """
+        self._mask, self._lat, self._lon = None, None, None
+        if self.mask_filepath is None:
+            return
+        self._nc = ReadNC(self.mask_filepath)
+        variables = (self._nc.mask, self._nc.latitude, self._nc.longitude)
+        if self._flipud:
+            variables = tuple(np.flipud(variable) for variable in variables)
+        self._mask, self._lat, self._lon = variables
 
     @property
     def mask(self):
-        mask = self._nc.mask
-        if self._flipud:
-            mask = np.flipud(mask)
-        return mask
+        return self._mask
 
     @property
     def lat(self):
-        lat = self._nc.latitude
-        if self._flipud:
-            lat = np.flipud(lat)
-        return lat
+        return self._lat
 
     @property
     def lon(self):
-        lon = self._nc.longitude
-        if self._flipud:
-            lon = np.flipud(lon)
-        return lon
+        return self._lon
 
     @property
     def mask_name(self):
@@ -422,10 +444,17 @@ class L1PHighResolutionLandMask(L1PProcItem):
 
         # Set the file for each hemisphere type
         mask_filepath = Path(lookup_directory) / str(filename)
-        with xr.open_dataset(mask_filepath) as nc:
-            self.grid_def = self.cfg.get("grid_def")
-            self.land_ocean_flag_grid = nc.land_ocean_flag.values
-            self.distance_to_coast_grid = nc.distance_to_coast.values
+        self.grid_def = self.cfg.get("grid_def")
+        self.land_ocean_flag_grid, self.distance_to_coast_grid = read_high_resolution_land_mask(
+            mask_filepath,
+            HR_LAND_OCEAN_FLAG_MISSING_VALUE
+        )
+
+        # Lookup table land/ocean flag (as uint8) -> surface type flag
+        # NOTE: All values except 0 and 1 (incl. the missing value) map to invalid
+        self.surface_type_lut = np.full(256, SURFACE_TYPE_DICT["invalid"], dtype=np.int8)
+        self.surface_type_lut[0] = SURFACE_TYPE_DICT["ocean"]
+        self.surface_type_lut[1] = SURFACE_TYPE_DICT["land"]
 
     def apply(self, l1: Level1bData) -> None:
         """
@@ -461,12 +490,9 @@ class L1PHighResolutionLandMask(L1PProcItem):
 
         # 3. Update the surface type instance
         valid_mask_indices = land_ocean_flag != self.cfg.get("dummy_val")["land_ocean_flag"]
-        flag_update = np.full(l1.n_records, SURFACE_TYPE_DICT["invalid"])
-        flag_update[land_ocean_flag == 1] = SURFACE_TYPE_DICT["land"]
-        flag_update[land_ocean_flag == 0] = SURFACE_TYPE_DICT["ocean"]
-        updated_surface_type_flag = l1.surface_type.flag.copy()
-        updated_surface_type_flag[valid_mask_indices] = flag_update[valid_mask_indices]
-        l1.surface_type.set_flag(updated_surface_type_flag)
+        flag_update = self.surface_type_lut[land_ocean_flag.astype(np.uint8)]
+        updated_surface_type_flag = np.where(valid_mask_indices, flag_update, l1.surface_type.flag)
+        l1.surface_type.set_flag(updated_surface_type_flag.astype(l1.surface_type.flag.dtype, copy=False))
 
     def get_trajectory(self, longitude: npt.NDArray, latitude: npt.NDArray) -> Tuple[npt.NDArray, npt.NDArray]:
         """
@@ -494,3 +520,118 @@ class L1PHighResolutionLandMask(L1PProcItem):
             outside_value=self.dummy_val["distance_to_coast"]
         )
         return land_ocean_flag, distance_to_coast
+
+
+def read_high_resolution_land_mask(mask_filepath: Path,
+                                   land_ocean_flag_fill_value: int
+                                   ) -> Tuple[npt.NDArray, npt.NDArray]:
+    """
+    Read the land/ocean flag and distance to coast grids from the high resolution
+    land mask file. The grids are cached per file and shared between all
+    instances of L1PHighResolutionLandMask. They are therefore read-only.
+
+    NOTE: The grids are stored as C-contiguous arrays with a fixed dtype
+          to avoid an internal copy in scipy.ndimage.map_coordinates for
+          each trajectory. The land/ocean flag is a signed integer since
+          the outside value (-1) must be representable.
+
+    :param mask_filepath: Path to the netCDF mask file
+    :param land_ocean_flag_fill_value: Value for masked land/ocean flag grid cells
+
+    :return: land/ocean flag grid, distance to coast grid
+    """
+    cache_key = (Path(mask_filepath).absolute(), land_ocean_flag_fill_value)
+    if cache_key in _HIGH_RESOLUTION_LAND_MASK_CACHE:
+        return _HIGH_RESOLUTION_LAND_MASK_CACHE[cache_key]
+
+    with Dataset(mask_filepath) as nc:
+        land_ocean_flag = np.ma.filled(nc.variables["land_ocean_flag"][:], land_ocean_flag_fill_value)
+        distance_to_coast = np.ma.filled(nc.variables["distance_to_coast"][:], np.nan)
+    land_ocean_flag_grid = np.ascontiguousarray(land_ocean_flag, dtype=np.int8)
+    distance_to_coast_grid = np.ascontiguousarray(distance_to_coast, dtype=np.float32)
+    land_ocean_flag_grid.setflags(write=False)
+    distance_to_coast_grid.setflags(write=False)
+
+    _HIGH_RESOLUTION_LAND_MASK_CACHE[cache_key] = land_ocean_flag_grid, distance_to_coast_grid
+    return land_ocean_flag_grid, distance_to_coast_grid
+
+
+def export_l3_mask_batch(masks: Dict[str, npt.NDArray],
+                         griddef: GridDefinition,
+                         nc_filepath: Union[str, Path]
+                         ) -> None:
+    """
+    Write several Level-3 masks on the same grid to a single netCDF file.
+    Longitude and latitude are written only once for all masks.
+
+    :param masks: Dictionary of mask variable name and mask array
+    (e.g. output of MaskSourceBase.get_l3_mask)
+    :param griddef: pysiral.grid.GridDefinition of the masks
+    :param nc_filepath: Path to the output file
+
+    :raises IOError: If the file cannot be created
+
+    :return: None
+    """
+    try:
+        rootgrp = Dataset(nc_filepath, "w")
+    except RuntimeError as ex:
+        raise IOError(f"Unable to create netCDF file: {nc_filepath}") from ex
+
+    logger.info(f"Export mask file: {nc_filepath}")
+    with rootgrp:
+        rootgrp.setncattr("title", "Mask file for pysiral Level3 Processor")
+        rootgrp.setncattr("mask_id", ", ".join(masks.keys()))
+        rootgrp.setncattr("grid_id", griddef.grid_id)
+        write_l3_mask_variables(rootgrp, griddef, masks)
+
+
+def write_l3_mask_variables(rootgrp: Dataset,
+                            griddef: GridDefinition,
+                            masks: Dict[str, npt.NDArray]
+                            ) -> None:
+    """
+    Write dimensions, longitude/latitude of grid cell centers and mask
+    variables to an open netCDF Dataset.
+
+    NOTE: The variables are written in 256x256 tiles with shuffle filter
+          to keep chunks small enough for partial reads of the grid. All
+          variables are created before any data is written.
+
+    :param rootgrp: netCDF4 Dataset (write mode)
+    :param griddef: pysiral.grid.GridDefinition of the masks
+    :param masks: Dictionary of mask variable name and mask array
+
+    :return: None
+    """
+
+    # Get longitude/latitude from grid definition
+    lons, lats = griddef.get_grid_coordinates()
+
+    # Write dimensions
+    shape = np.shape(lons)
+    dims = ("x", "y")
+    for dim_name, dim_size in zip(dims, shape):
+        rootgrp.createDimension(dim_name, dim_size)
+
+    # Create variables
+    chunksizes = tuple(min(256, n) for n in shape)
+    compression_kwargs = dict(zlib=True, complevel=4, shuffle=True, chunksizes=chunksizes)
+    variables = []
+    for mask_name, mask in masks.items():
+        var = rootgrp.createVariable(mask_name, mask.dtype.str, dims, **compression_kwargs)
+        variables.append((var, mask))
+
+    coordinate_attrs = [("longitude", lons), ("latitude", lats)]
+    for coordinate_name, coordinate in coordinate_attrs:
+        var = rootgrp.createVariable(coordinate_name, coordinate.dtype.str, dims, **compression_kwargs)
+        setattr(var, "long_name", f"{coordinate_name} of grid cell center")
+        setattr(var, "standard_name", coordinate_name)
+        setattr(var, "units", "degrees")
+        setattr(var, "scale_factor", 1.0)
+        setattr(var, "add_offset", 0.0)
+        variables.append((var, coordinate))
+
+    # Write data
+    for var, data in variables:
+        var[:] = data
@@ -72,6 +72,10 @@ class BaseRetracker(object):
         self._l1b = l1b
         self._l2 = l2
 
+        # Remove auxiliary output of previous calls
+        # NOTE: Retracker instances may be reused for several l1b/l2 data objects
+        self.auxdata_output = []
+
         # Initialize the retracked range with an NaN array
         # -> only waveforms of type "surface_type" will retracked
         self._create_default_properties(l1b.n_records)
@@ -159,6 +163,9 @@ class Level2RetrackerContainer(Level2ProcessorStep):
         """
         super(Level2RetrackerContainer, self).__init__(*args, **kwargs)
 
+        # Retracker instances with options per surface type (see get_retracker)
+        self._retracker_cache = {}
+
     def execute_procstep(self, l1b, l2):
         """
         Mandatory class
@@ -187,14 +194,10 @@ class Level2RetrackerContainer(Level2ProcessorStep):
                 )
 
             # Benchmark retracker performance
-            timestamp = time.time()
+            timestamp = time.perf_counter()
 
             # Retrieve the retracker associated with surface type from the l2 settings
-            retracker = get_retracker_class(retracker_def["pyclass"])
-
-            # Set options (if any)
-            if retracker_def["options"] is not None:
-                retracker.set_options(**retracker_def["options"])
+            retracker = self.get_retracker(surface_type, retracker_def)
 
             # set subset of waveforms
             retracker.set_indices(surface_type_flag.indices)
@@ -214,12 +217,32 @@ class Level2RetrackerContainer(Level2ProcessorStep):
             # retrieve potential error status and update surface type flag
             if retracker.error_flag.num > 0:
                 l2.surface_type.add_flag(retracker.error_flag.flag, "invalid")
-            logger.info("- Retrack class %s with %s in %.3f seconds" % (
-                surface_type, retracker_def["pyclass"],
-                time.time()-timestamp))
+            logger.info("- Retrack class {} with {} in {:.3f} seconds",
+                        surface_type, retracker_def["pyclass"], time.perf_counter() - timestamp)
 
         return error_status
 
+    def get_retracker(self, surface_type, retracker_def):
+        """
+        Return the retracker instance for a surface type. The instance is
+        initialized (incl. options) only once and reused for all following
+        l1b/l2 data objects.
+        :param surface_type: (str) surface type name
+        :param retracker_def: (dict-like) retracker definition of the l2 settings
+        :return: retracker instance
+        """
+        key = (surface_type, retracker_def["pyclass"])
+        retracker = self._retracker_cache.get(key)
+        if retracker is None:
+            retracker = get_retracker_class(retracker_def["pyclass"])
+
+            # Set options (if any)
+            if retracker_def["options"] is not None:
+                retracker.set_options(**retracker_def["options"])
+
+            self._retracker_cache[key] = retracker
+        return retracker
+
     @property
     def l2_input_vars(self):
         return []
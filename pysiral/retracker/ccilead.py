@@ -10,7 +10,6 @@ __author__ = "Stefan Hendricks <stefan.hendricks@awi.de>"
 from typing import Any
 
 import numpy as np
-from scipy.interpolate import interp1d
 from scipy.optimize import curve_fit
 
 from pysiral.core.flags import ANDCondition
@@ -49,7 +48,9 @@ class SICCILead(BaseRetracker):
         initial_guess = list(self._options.initial_guess)
         maxfev = self._options.maxfev
         time = np.arange(wfm.shape[1]-skip).astype(float)
-        x = np.arange(wfm.shape[1])
+        # NOTE: The bin index array is also used as time for the model
+        #       waveform in the echo/model rms computation
+        x = np.arange(wfm.shape[1]).astype(float)
 
         # Loop over lead indices
         for index in indices:
@@ -61,6 +62,7 @@ class SICCILead(BaseRetracker):
                 time,
                 wave.astype(float),
                 p0=initial_guess,
+                jac=pl_lead_waveform_jacobian,
                 maxfev=maxfev
             )
 
@@ -78,15 +80,15 @@ class SICCILead(BaseRetracker):
                 wfm[index, :], self.retracked_bin[index], self.alpha[index])
             self.rms_echo_and_model[index] = rms_echo_and_model(
                 wfm[index, :], self.retracked_bin[index],
-                self.k[index], self.sigma[index], self.alpha[index])
+                self.k[index], self.sigma[index], self.alpha[index],
+                time=x)
 
             # Get the range by interpolation of range bin location
-            try:
-                self._range[index] = interp1d(
-                    x, rng[index, :], kind='linear', copy=False)(
-                        self.retracked_bin[index])
-            except ValueError:
-                self._range[index] = np.nan
+            # (NaN if the retracked bin is outside the range window)
+            retracked_bin = self.retracked_bin[index]
+            if x[0] <= retracked_bin <= x[-1]:
+                self._range[index] = np.interp(retracked_bin, x, rng[index, :])
+            else:
                 self._range[index] = np.nan
 
     def _filter_results(self):
@@ -150,14 +152,73 @@ def pl_lead_waveform_model(t, t_0, k, sigma, a):
     return a*np.exp(-F*F)  # Return e^-f^2(t)
 
 
-def rms_echo_and_model(wfm, retracked_bin, k, sigma, alpha):
+def pl_lead_waveform_jacobian(t, t_0, k, sigma, a):
+    """
+    Analytic Jacobian of the lead waveform model with respect to the
+    parameters (t_0, k, sigma, a) for the curve fitting in SICCILead.
+    With P = a*exp(-F^2) the derivatives are dP/dp = -2*F*dF/dp*P for
+    p in (t_0, k, sigma) and dP/da = exp(-F^2).
+
+    NOTE: The derivatives of the piecewise definition of F are evaluated
+          for each piece with the same masks as in `pl_lead_waveform_model`,
+          the (parameter dependent) piece boundaries are ignored.
+
+    :param t: time (range bin) array
+    :param t_0: tracking point
+    :param k: echo decay parameter
+    :param sigma: width of the gaussian rise
+    :param a: echo amplitude
+
+    :return: Jacobian array with shape (len(t), 4)
+    """
+    # Same intermediate values as in the waveform model
+    t_b = k*sigma**2
+    sq_ktb = np.sqrt(k*t_b)
+    aa_num, aa_den = (5*k*sigma) - (4*sq_ktb), 2*sigma*t_b*sq_ktb
+    aaa_num, aaa_den = (2*sq_ktb)-(3*k*sigma), 2*sigma*t_b*t_b*sq_ktb
+    aa, aaa = aa_num / aa_den, aaa_num / aaa_den
+    t_diff = (t - t_0)
+
+    # Derivatives of the polynomial coefficients for F_L (quotient rule)
+    dsq_dk, dsq_dsigma = k*sigma**2/sq_ktb, k*k*sigma/sq_ktb
+    daa_dk = ((5*sigma - 4*dsq_dk) - aa*(2*sigma**3*sq_ktb + 2*k*sigma**3*dsq_dk)) / aa_den
+    daa_dsigma = ((5*k - 4*dsq_dsigma) - aa*(6*k*sigma**2*sq_ktb + 2*k*sigma**3*dsq_dsigma)) / aa_den
+    daaa_dk = ((2*dsq_dk - 3*sigma) - aaa*(4*k*sigma**5*sq_ktb + 2*k*k*sigma**5*dsq_dk)) / aaa_den
+    daaa_dsigma = ((2*dsq_dsigma - 3*k) - aaa*(10*k*k*sigma**4*sq_ktb + 2*k*k*sigma**5*dsq_dsigma)) / aaa_den
+
+    # Piecewise F and its derivatives (t_0, k, sigma)
+    is_1 = t <= t_0
+    is_2 = t >= (t_b+t_0)
+    is_l = np.logical_and(t > t_0, t < (t_b+t_0))
+    f_2 = np.sqrt(np.abs(t_diff)*k)
+    f_l = aaa*t_diff**3 + aa*t_diff**2 + t_diff/sigma
+    F = is_1 * (t_diff/sigma) + is_l * f_l + is_2 * f_2
+
+    # F_2 is not differentiable at zero, use zero as derivative there
+    f_2_valid = is_2 & (f_2 > 0)
+    f_2_safe = np.where(f_2_valid, f_2, 1.0)
+    dF_dt0 = -(is_1/sigma) - is_l * (3*aaa*t_diff**2 + 2*aa*t_diff + 1./sigma)
+    dF_dt0 = dF_dt0 - f_2_valid * k*np.sign(t_diff)/(2*f_2_safe)
+    dF_dk = is_l * (daaa_dk*t_diff**3 + daa_dk*t_diff**2) + f_2_valid * np.abs(t_diff)/(2*f_2_safe)
+    dF_dsigma = -(is_1*t_diff)/sigma**2 + is_l * (daaa_dsigma*t_diff**3 + daa_dsigma*t_diff**2 - t_diff/sigma**2)
+
+    exp_f2 = np.exp(-F*F)
+    dp_df = -2*F*a*exp_f2
+    return np.column_stack((dp_df*dF_dt0, dp_df*dF_dk, dp_df*dF_dsigma, exp_f2))
+
+
+def rms_echo_and_model(wfm, retracked_bin, k, sigma, alpha, time=None):
     """
     The root sum squared difference between the echo and the fitted function
     in the lead retracking is computed. The 5 bins before the tracking point
     are used as the echo rise.
+
+    The (float) bin index array of the waveform can be passed as `time`
+    to avoid re-creating it for each waveform.
     """
     tracking_point = int(retracked_bin)
-    time = np.arange(len(wfm)).astype(float)
+    if time is None:
+        time = np.arange(len(wfm)).astype(float)
     modeled_wave = pl_lead_waveform_model(time, retracked_bin, k, sigma, alpha)
     diff = wfm[tracking_point-4:tracking_point+1] - modeled_wave[tracking_point-4:tracking_point+1]
     return np.sqrt(np.sum(diff*diff)/5)/alpha
@@ -5,7 +5,6 @@ This OCOG implementation comes from the first phase of the ESA Climate Change In
 """
 
 import numpy as np
-from scipy.interpolate import interp1d
 
 from pysiral.core.flags import ANDCondition
 from pysiral.retracker import BaseRetracker
@@ -53,10 +52,11 @@ class SICCIOcog(BaseRetracker):
             wave = np.array(wfm[index, skip:]).astype("float64")
             range_bin = ocog_func(wave, percentage, skip)
             range_bin_lew = ocog_func(wave, lew_percentage, skip)
-            try:
-                self._range[index] = interp1d(
-                    x, range[index, :], kind='linear', copy=False)(range_bin)
-            except ValueError:
+            # Get the range by interpolation of range bin location
+            # (invalid if the retracked bin is outside the range window)
+            if x[0] <= range_bin <= x[-1]:
+                self._range[index] = np.interp(range_bin, x, range[index, :])
+            else:
                 self.retracked_bin[index] = np.nan
                 self.leading_edge_width[index] = np.nan
                 self.tail_shape[index] = np.nan
@@ -97,12 +97,16 @@ def ocog_tail_shape(wfm, tracking_point, tail_pad=3):
 
 
 def ocog_func(wave, percentage, skip):
+    # NOTE: The sum of fourth powers is the dot product of the squared
+    #       waveform with itself (no additional temporary array)
     waveform = wave*wave
     sq_sum = np.sum(waveform)
-    waveform = waveform*waveform
-    qa_sum = np.sum(waveform)
+    qa_sum = np.dot(waveform, waveform)
     # Calculate retracking threshold (2.6.2 in ATDBv0)
     threshold = percentage * np.sqrt(qa_sum / sq_sum)
-    ind_first_over = np.min(np.nonzero(wave > threshold))
+    is_above = wave > threshold
+    ind_first_over = np.argmax(is_above)
+    if not is_above[ind_first_over]:
+        raise ValueError("No waveform bin above OCOG threshold")
     decimal = (wave[ind_first_over-1] - threshold) / (wave[ind_first_over-1] - wave[ind_first_over])
     return skip + ind_first_over - 1 + decimal
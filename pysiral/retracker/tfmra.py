@@ -6,6 +6,7 @@
 
 __author__ = "Stefan Hendricks <stefan.hendricks@awi.de>"
 
+from functools import lru_cache
 from typing import Tuple
 
 import bottleneck as bn
@@ -17,15 +18,17 @@ from pysiral.retracker import BaseRetracker
 
 # cythonized bottleneck functions for cTFMRA
 try:
-    from pysiral.retracker.cytfmra import (cytfmra_findpeaks,
-                                           cytfmra_interpolate,
-                                           cytfmra_normalize_wfm,
-                                           cytfmra_wfm_noise_level)
+    from pysiral.retracker.cytfmra import cytfmra_findpeaks
     CYTFMRA_OK = True
 except ImportError:
     logger.error("Cannot import cytfmra")
     CYTFMRA_OK = False
 
+# Maximum number of waveforms that are filtered at once
+# NOTE: The oversampled waveforms of a batch should fit into the CPU cache,
+#       larger batches are slower.
+WFM_BATCH_SIZE = 100
+
 
 class cTFMRA(BaseRetracker):
     """
@@ -141,72 +144,77 @@ class cTFMRA(BaseRetracker):
         # The power threshold for the first maximum (radar mode dependant list)
         first_maximum_normalized_threshold = self._options.first_maximum_normalized_threshold
 
+        # Waveforms are always oversampled by linear interpolation
+        oversampling_method = self._options.get("wfm_oversampling_method", "linear")
+        if oversampling_method != "linear":
+            logger.warning(f"cTFMRA: oversampling method {oversampling_method} not supported, using linear")
+
+        # Option to use the absolute maximum as first maximum
+        first_maximum_equal_total_maximum = self._options.get("first_maximum_equal_total_maximum", False)
+
+        # The bin range for the noise level computation in the oversampled waveform
+        i0, i1 = [idx * oversampling_factor for idx in noise_level_range_idx]
+
         # --- Waveform Retracking ---
-        # NOTE: This is a loop over all waveforms in the trajectory data but only those
-        #       listed in the list of indices will be processed. The reason for this
+        # NOTE: Only the waveforms listed in the list of indices will be processed. The reason for this
         #       approach is that different retracker settings are needed for different
         #       surface types and radar modes and the initial thought was to avoid
         #       a copying of data.
-        # TODO: This is a candidate for multi-processing
-
-        for i in indices:
-
-            # Do not retrack waveforms that are marked as invalid
-            if not is_valid[i]:
-                continue
-
-            # Get the filtered waveform
-            window_size = wfm_smoothing_window_size[radar_mode[i]]
-            filt_rng, filt_wfm, norm = self.get_filtered_wfm(rng[i, :], wfm[i, :], oversampling_factor, window_size)
-
-            # Get noise level in normalized units
-            i0, i1 = [idx * oversampling_factor for idx in noise_level_range_idx]
-            noise_level_normed = cytfmra_wfm_noise_level(filt_wfm, i0, i1)
-            tfmra_noise_power[i] = noise_level_normed * norm
-
-            # Find first maxima
-            # (needs to be above radar mode dependent noise threshold)
-            first_maximum_equal_total_maximum = self._options.get("first_maximum_equal_total_maximum", False)
-            if first_maximum_equal_total_maximum:
-                fmi = np.argmax(filt_wfm)
-            else:
-                fmnt = first_maximum_normalized_threshold[radar_mode[i]]
-                peak_minimum_power = fmnt + noise_level_normed
-                fmi = self.get_first_maximum_index(filt_wfm, peak_minimum_power, fmi_first_valid_idx_filt)
-            tfmra_first_maximum_index[i] = fmi
-
-            # first maximum finder might have failed
-            if fmi == -1:
-                self._range[i] = np.nan
-                self._power[i] = np.nan
-                continue
-
-            # Get track point and its power
-            tfmra_range, tfmra_power, _ = self.get_threshold_range(filt_rng,
-                                                                   filt_wfm,
-                                                                   fmi,
-                                                                   tfmra_threshold[i],
-                                                                   fmi_first_valid_idx_filt)
-
-            # Set the values
-            self._range[i] = tfmra_range + fixed_range_offset
-            self._power[i] = tfmra_power * norm
+        #       The waveform filtering (oversampling, smoothing, normalization) is
+        #       done for batches of waveforms with the same radar mode, since the
+        #       filter settings only depend on the radar mode.
+        indices = np.asarray(indices)
+        indices = indices[is_valid[indices]]
+        for radar_mode_index in np.unique(radar_mode[indices]):
+
+            # Radar mode dependent settings
+            # NOTE: Raises an IndexError if the radar mode is not covered by the settings
+            window_size = wfm_smoothing_window_size[radar_mode_index]
+            fmnt = first_maximum_normalized_threshold[radar_mode_index]
+            range_bias = self._options.range_bias[radar_mode_index] if "range_bias" in self._options else 0.0
+
+            radar_mode_indices = indices[radar_mode[indices] == radar_mode_index]
+            for batch_indices in get_batches(radar_mode_indices):
+
+                # Get the filtered waveforms
+                filt_rng, filt_wfm, norm, max_idx = get_filtered_wfms(rng[batch_indices, :],
+                                                                      wfm[batch_indices, :],
+                                                                      oversampling_factor,
+                                                                      window_size)
+
+                # Get noise level in normalized units
+                noise_level_normed = bn.nanmean(filt_wfm[:, i0:i1], axis=1)
+                tfmra_noise_power[batch_indices] = noise_level_normed * norm
+
+                # Find first maxima
+                # (needs to be above radar mode dependent noise threshold)
+                if first_maximum_equal_total_maximum:
+                    batch_fmi = np.argmax(filt_wfm, axis=1)
+                else:
+                    peak_minimum_power = fmnt + noise_level_normed
+                    batch_fmi = get_first_maximum_indices(filt_wfm, peak_minimum_power,
+                                                          fmi_first_valid_idx_filt, max_idx)
+                tfmra_first_maximum_index[batch_indices] = batch_fmi
+
+                # Get track point and its power
+                # NOTE: The range and power is NaN if the first maximum finder has failed
+                tfmra_range, tfmra_power = get_threshold_ranges(filt_rng,
+                                                                filt_wfm,
+                                                                batch_fmi,
+                                                                tfmra_threshold[batch_indices],
+                                                                fmi_first_valid_idx_filt)
+
+                # Set the values
+                # NOTE: Includes the optional radar mode dependent range bias
+                #       (if option is in level-2 settings file)
+                self._range[batch_indices] = tfmra_range + fixed_range_offset - range_bias
+                self._power[batch_indices] = tfmra_power * norm
 
         # Add auxiliary variables to the l2 data
         self.register_auxdata_output("tfmrathr", "tfmra_threshold", tfmra_threshold)
         self.register_auxdata_output("tfmrafmi", "tfmra_first_maximum_index", tfmra_first_maximum_index)
         self.register_auxdata_output("tfmranp", "tfmra_noise_power", tfmra_noise_power)
 
-        # Apply a radar mode dependent range bias if option is in
-        # level-2 settings file
-        if "range_bias" in self._options:
-            for radar_mode_index in np.arange(3):
-                indices = np.where(radar_mode == radar_mode_index)[0]
-                if len(indices) == 0:
-                    continue
-                range_bias = self._options.range_bias[radar_mode_index]
-                self._range[indices] -= range_bias
-
         if (
             "uncertainty" in self._options
             and self._options.uncertainty.type == "fixed"
@@ -237,40 +245,29 @@ class cTFMRA(BaseRetracker):
 
         # Option 2 (deprecated): Threshold as a function of sigma0
         elif option.type == "sigma_func":
-            sigma0 = self.get_l1b_parameter("classifier", "sigma0")
-            value = np.zeros(sigma0.shape)
-            for i, coef in enumerate(option.coef):
-                value += coef * sigma0**i
-            threshold[indices] = value[indices]
+            sigma0 = self.get_l1b_parameter("classifier", "sigma0")[indices]
+            threshold[indices] = np.polyval(option.coef[::-1], sigma0)
 
         # Option 3 (deprecated): Threshold as a function of sigma0 and sea ice type
         elif option.type == "sitype_sigma_func":
-            sigma0 = self.get_l1b_parameter("classifier", "sigma0")
-            sitype = self._l2.sitype
-            value = np.zeros(sigma0.shape)
-            for i, coef in enumerate(option.coef_fyi):
-                value += coef * sigma0**i
-            value_myi = np.zeros(sigma0.shape)
-            for i, coef in enumerate(option.coef_myi):
-                value_myi += coef * sigma0**i
-            myi_list = np.where(sitype > 0.5)[0]
-            value[myi_list] = value_myi[myi_list]
-            threshold[indices] = value[indices]
+            sigma0 = self.get_l1b_parameter("classifier", "sigma0")[indices]
+            sitype = self._l2.sitype[indices]
+            value = np.polyval(option.coef_fyi[::-1], sigma0)
+            value_myi = np.polyval(option.coef_myi[::-1], sigma0)
+            np.copyto(value, value_myi, where=sitype > 0.5)
+            threshold[indices] = value
 
         # Option 4 (deprecated): Threshold as a function of sigma0 and leading-edge
         #   width 3rd order polynomial fit. Algorithm for CCI/C3S Envisat CDR
         elif option.type == "poly_plane_fit":
 
             # Get the required classifier
-            sigma0 = self.get_l1b_parameter("classifier", "sigma0")
-            lew = self.get_l1b_parameter("classifier", "leading_edge_width")
-            value = np.zeros(sigma0.shape)
-            value += option.intercept
-            for i, coef in enumerate(option.coef_lew):
-                value += coef * lew**(i+1)
-            for i, coef in enumerate(option.coef_sig0):
-                value += coef * sigma0**(i+1)
-            threshold[indices] = value[indices]
+            sigma0 = self.get_l1b_parameter("classifier", "sigma0")[indices]
+            lew = self.get_l1b_parameter("classifier", "leading_edge_width")[indices]
+            # NOTE: The polynomials have no constant term (-> intercept)
+            value = option.intercept + np.polyval([*option.coef_lew[::-1], 0.0], lew)
+            value += np.polyval([*option.coef_sig0[::-1], 0.0], sigma0)
+            threshold[indices] = value
 
         # TODO: remove dependency of TFMRA threshold to l2 object
         elif option.type == "l2_variable":
@@ -326,36 +323,55 @@ class cTFMRA(BaseRetracker):
         # Dimensions of the waveforms
         wfm_shape = (wfm.shape[0], wfm.shape[1]*oversampling_factor)
 
+        # NOTE: The oversampled waveform arrays are not initialized with NaN's, since
+        #       most waveforms will be filtered. Only waveforms that have not been
+        #       filtered are set to NaN afterwards.
         # Window delay (range)
-        filt_rng = np.full(wfm_shape, np.nan)
+        filt_rng = np.empty(wfm_shape)
         # Waveform Power
-        filt_wfm = np.full(wfm_shape, np.nan)
+        filt_wfm = np.empty(wfm_shape)
+        # Flag indicating waveforms that have been filtered
+        is_filtered = np.zeros(wfm_shape[0], dtype=bool)
         # First Maximum Index
         fmi = np.full(wfm_shape[0], -1, dtype=np.int32)
         # Waveform norm (max power)
         norm = np.full(wfm_shape[0], np.nan)
 
-        # --- Loop over all Waveforms ---
-        for i in np.arange(wfm.shape[0]):
+        # The bin range for the noise level computation in the oversampled waveform
+        i0, i1 = [idx * oversampling_factor for idx in noise_level_range_idx]
+        fmi_first_valid_idx_filt = fmi_first_valid_idx * oversampling_factor
+
+        # --- Filter waveforms in batches of the same radar mode ---
+        valid_indices = np.flatnonzero(is_valid)
+        for radar_mode_index in np.unique(radar_mode[valid_indices]):
+
+            # NOTE: Raises an IndexError if the radar mode is not covered by the settings
+            window_size = wfm_smoothing_window_size[radar_mode_index]
+            fmnt = first_maximum_normalized_threshold[radar_mode_index]
+            radar_mode_indices = valid_indices[radar_mode[valid_indices] == radar_mode_index]
 
-            if not is_valid[i]:
-                continue
+            for batch_indices in get_batches(radar_mode_indices):
 
-            # Get the filtered waveform
-            window_size = wfm_smoothing_window_size[radar_mode[i]]
-            result = self.get_filtered_wfm(rng[i, :], wfm[i, :], oversampling_factor, window_size)
-            filt_rng[i, :], filt_wfm[i, :], norm[i] = result
+                # Get the filtered waveforms
+                result = get_filtered_wfms(rng[batch_indices, :], wfm[batch_indices, :],
+                                           oversampling_factor, window_size)
+                batch_rng, batch_wfm, norm[batch_indices], max_idx = result
+                filt_rng[batch_indices, :] = batch_rng
+                filt_wfm[batch_indices, :] = batch_wfm
+                is_filtered[batch_indices] = True
 
-            # Get noise level in normalized units
-            i0, i1 = [idx * oversampling_factor for idx in noise_level_range_idx]
-            noise_level_normed = cytfmra_wfm_noise_level(filt_wfm[i, :], i0, i1)
+                # Get noise level in normalized units
+                noise_level_normed = bn.nanmean(batch_wfm[:, i0:i1], axis=1)
+
+                # Find first maxima
+                # (needs to be above radar mode dependent noise threshold)
+                peak_minimum_power = fmnt + noise_level_normed
+                fmi[batch_indices] = get_first_maximum_indices(batch_wfm, peak_minimum_power,
+                                                               fmi_first_valid_idx_filt, max_idx)
 
-            # Find first maxima
-            # (needs to be above radar mode dependent noise threshold)
-            fmnt = first_maximum_normalized_threshold[radar_mode[i]]
-            peak_minimum_power = fmnt + noise_level_normed
-            fmi_first_valid_idx_filt = fmi_first_valid_idx * oversampling_factor
-            fmi[i] = self.get_first_maximum_index(filt_wfm[i, :], peak_minimum_power, fmi_first_valid_idx_filt)
+        # Waveforms that have not been filtered
+        filt_rng[~is_filtered, :] = np.nan
+        filt_wfm[~is_filtered, :] = np.nan
 
         return filt_rng, filt_wfm, fmi, norm
 
@@ -364,7 +380,6 @@ class cTFMRA(BaseRetracker):
         Return the distance between two thresholds t0 < t1
         """
 
-        width = np.full(rng.shape[0], np.nan, dtype=np.float32)
         r0 = np.full(rng.shape[0], np.nan, dtype=np.float32)
         p0 = np.full(rng.shape[0], np.nan, dtype=np.float32)
         r1 = np.full(rng.shape[0], np.nan, dtype=np.float32)
@@ -373,15 +388,13 @@ class cTFMRA(BaseRetracker):
         noise_level_range_bin_idx = self._options.noise_level_range_bin_idx
         oversampling_factor = self._options.wfm_oversampling_factor
         first_valid_idx = noise_level_range_bin_idx[1] * oversampling_factor
-        for i in np.arange(rng.shape[0]):
-            if fmi[i] is None:
-                continue
-
-            r0[i], p0[i], i0 = self.get_threshold_range(
-                rng[i, :], wfm[i, :], fmi[i], t0, first_valid_idx=first_valid_idx)
-            r1[i], p1[i], i1 = self.get_threshold_range(
-                rng[i, :], wfm[i, :], fmi[i], t1, first_valid_idx=first_valid_idx)
-            width[i] = r1[i] - r0[i]
+        for batch_indices in get_batches(np.arange(rng.shape[0])):
+            batch_rng, batch_wfm, batch_fmi = rng[batch_indices, :], wfm[batch_indices, :], fmi[batch_indices]
+            r0[batch_indices], p0[batch_indices] = get_threshold_ranges(
+                batch_rng, batch_wfm, batch_fmi, t0, first_valid_idx=first_valid_idx)
+            r1[batch_indices], p1[batch_indices] = get_threshold_ranges(
+                batch_rng, batch_wfm, batch_fmi, t1, first_valid_idx=first_valid_idx)
+        width = r1 - r0
 
         # some irregular waveforms might produce negative width values
         is_negative = np.where(width < 0.)[0]
@@ -401,20 +414,18 @@ class cTFMRA(BaseRetracker):
         :return:
         """
 
-        # Use cython implementation of waveform oversampling
-        filt_rng, wfm_os = cytfmra_interpolate(rng.astype(np.float64), wfm.astype(np.float64), oversampling_factor)
-
-        # Smooth the waveform using a box smoother
-        filt_wfm = bnsmooth(wfm_os, window_size)
-
-        # Normalize filtered waveform
-        filt_wfm, norm = cytfmra_normalize_wfm(filt_wfm)
+        # Use the implementation for waveform batches, which determines the
+        # norm in the same pass as the position of the maximum
+        filt_rng, filt_wfm, norm, _ = get_filtered_wfms(rng.astype(np.float64)[np.newaxis, :],
+                                                        wfm.astype(np.float64)[np.newaxis, :],
+                                                        oversampling_factor,
+                                                        window_size)
 
         # All done, return
-        return filt_rng, filt_wfm, norm
+        return filt_rng[0, :], filt_wfm[0, :], norm[0]
 
     @staticmethod
-    def get_first_maximum_index(wfm, peak_minimum_power, first_valid_idx=0):
+    def get_first_maximum_index(wfm, peak_minimum_power, first_valid_idx=0, absolute_maximum_index=None):
         """
         Return the index of the first peak (first maximum) on the leading edge
         before the absolute power maximum. The first peak is only valid if
@@ -423,13 +434,18 @@ class cTFMRA(BaseRetracker):
         :param peak_minimum_power: (float) threshold for normalized power that
             a peak must surpass to be regarded as a first maximum candidate
         :param first_valid_idx: (int):
+        :param absolute_maximum_index: (int) Index of the absolute maximum (optional, will
+            be computed if not specified, -1 for waveforms without valid power)
         :return:
         """
 
         # Get the main maximum first
-        try:
-            absolute_maximum_index = bn.nanargmax(wfm)
-        except ValueError:
+        if absolute_maximum_index is None:
+            try:
+                absolute_maximum_index = bn.nanargmax(wfm)
+            except ValueError:
+                return -1
+        elif absolute_maximum_index == -1:
             return -1
 
         # Find relative maxima before the absolute maximum
@@ -441,12 +457,13 @@ class cTFMRA(BaseRetracker):
         peaks = cytfmra_findpeaks(wfm[first_valid_idx:absolute_maximum_index+1])+first_valid_idx
 
         # Check if relative maximum are above the required threshold
-        leading_maxima = np.where(wfm[peaks] >= peak_minimum_power)[0]
+        is_leading_maximum = wfm[peaks] >= peak_minimum_power
 
         # Identify the first maximum
+        # NOTE: np.argmax returns the index of the first leading maximum
         first_maximum_index = int(absolute_maximum_index)
-        if len(leading_maxima) > 0:
-            first_maximum_index = peaks[leading_maxima[0]]
+        if is_leading_maximum.any():
+            first_maximum_index = peaks[np.argmax(is_leading_maximum)]
 
         return first_maximum_index
 
@@ -473,14 +490,18 @@ class cTFMRA(BaseRetracker):
         # Get power of retracked point
         tfmra_power = threshold*first_maximum_power
 
-        # Use linear interpolation to get exact range value
-        points = np.where(wfm[first_valid_idx:first_maximum_index] > tfmra_power)[0]+first_valid_idx
+        # Get the first range bin above the threshold power
+        # NOTE: np.argmax returns the first occurrence of True without
+        #       the need to compute the indices of all range bins above the threshold
+        is_above = wfm[first_valid_idx:first_maximum_index] > tfmra_power
 
         # Check if something went wrong with the first maximum
-        if len(points) == 0:
+        if not is_above.any():
             return np.nan, np.nan, np.nan
 
-        i0, i1 = points[0]-1, points[0]
+        # Use linear interpolation to get exact range value
+        i1 = np.argmax(is_above) + first_valid_idx
+        i0 = i1 - 1
         gradient = (wfm[i1]-wfm[i0])/(rng[i1]-rng[i0])
         tfmra_range = (tfmra_power - wfm[i0]) / gradient + rng[i0]
 
@@ -525,14 +546,11 @@ class TFMRAMultiThresholdFreeboards(Level2ProcessorStep):
         # Construct the output array
         ranges = np.full((l2.n_records, thresholds.size), np.nan)
 
-        for i in np.where(l2.surface_type.sea_ice.flag)[0]:
+        for batch_indices in get_batches(np.where(l2.surface_type.sea_ice.flag)[0]):
+            batch_rng, batch_wfm, batch_fmi = filt_rng[batch_indices, :], filt_wfm[batch_indices, :], fmi[batch_indices]
             for j, threshold in enumerate(thresholds):
-                retracked_range, _, _ = tfmra.get_threshold_range(
-                    filt_rng[i, :],
-                    filt_wfm[i, :],
-                    fmi[i],
-                    threshold)
-                ranges[i, j] = retracked_range
+                retracked_range, _ = get_threshold_ranges(batch_rng, batch_wfm, batch_fmi, threshold)
+                ranges[batch_indices, j] = retracked_range
 
         # Convert ranges to freeboards using the already pre-computed steps.
         # NOTE: This specifically assumes that the sea surface height is constant
@@ -566,12 +584,193 @@ class TFMRAMultiThresholdFreeboards(Level2ProcessorStep):
         return self.error_flag_bit_dict["other"]
 
 
+def get_batches(indices, batch_size=WFM_BATCH_SIZE):
+    """
+    Split a list of waveform indices into batches of limited size
+    :param indices: (np.array) waveform indices
+    :param batch_size: (int) maximum number of waveforms per batch
+    :return: generator of index arrays
+    """
+    for i in range(0, len(indices), batch_size):
+        yield indices[i:i+batch_size]
+
+
+def get_filtered_wfms(rng, wfm, oversampling_factor, window_size):
+    """
+    Return filtered versions of a stack of waveforms (vectorized version
+    of cTFMRA.get_filtered_wfm). This process includes oversampling, smoothing
+    and normalization to the maximum power.
+    :param rng: (np.array, dim:(n_records, n_bins)) window delay for each range bin
+    :param wfm: (np.array, dim:(n_records, n_bins)) the power for each range bin with
+        sensor dependent units
+    :param oversampling_factor: (int) The waveform oversampling factor
+    :param window_size: (int) The filter size of the box filter
+    :return: filtered range (n_records, n_bins*oversampling_factor), filtered waveform power
+        (n_records, n_bins*oversampling_factor), waveform norm (n_records), index of the
+        absolute maximum (n_records)
+    """
+
+    # Oversampled range bins: Linear spacing between first and last range bin
+    # (identical to cytfmra_interpolate)
+    n_os = wfm.shape[1] * oversampling_factor
+    step = (rng[:, -1] - rng[:, 0]) / float(n_os - 1)
+    filt_rng = get_oversampled_bin_index(n_os) * step[:, np.newaxis] + rng[:, [0]]
+
+    # Waveform oversampling by linear interpolation
+    # NOTE: np.interp for each waveform is as fast as a vectorized
+    #       interpolation of all waveforms with a common index grid
+    #       and has no additional memory footprint.
+    wfm_os = np.empty(filt_rng.shape)
+    for i in range(wfm.shape[0]):
+        wfm_os[i, :] = np.interp(filt_rng[i, :], rng[i, :], wfm[i, :])
+
+    # Smooth the waveforms using a box smoother
+    filt_wfm = bnsmooth(wfm_os, window_size)
+
+    # Normalize filtered waveforms
+    # NOTE: Waveforms without positive maximum power (e.g. all zero) are invalid
+    #       (NaN after normalization, absolute maximum index -1)
+    absolute_maximum_index, norm = get_wfms_maximum(filt_wfm)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        filt_wfm /= norm[:, np.newaxis]
+    absolute_maximum_index[norm <= 0] = -1
+
+    return filt_rng, filt_wfm, norm, absolute_maximum_index
+
+
+def get_first_maximum_indices(wfm, peak_minimum_power, first_valid_idx, absolute_maximum_index):
+    """
+    Return the index of the first peak (first maximum) on the leading edge
+    before the absolute power maximum for a stack of waveforms (vectorized
+    version of cTFMRA.get_first_maximum_index). The first peak is only valid if
+    its power exceeds a certain threshold, otherwise the absolute maximum
+    is used.
+    :param wfm: (np.array, dim:(n_records, n_bins)) normalized waveform power
+    :param peak_minimum_power: (np.array, dim:(n_records)) threshold for normalized
+        power that a peak must surpass to be regarded as a first maximum candidate
+    :param first_valid_idx: (int) first valid range bin index for the first maximum
+    :param absolute_maximum_index: (np.array, dim:(n_records)) Index of the absolute
+        maximum (-1 for waveforms without valid power)
+    :return: (np.array, dim:(n_records)) first maximum index (-1 for waveforms without
+        valid power)
+    """
+
+    # NOTE: Only the range bins up to the last absolute maximum need to be searched
+    n_bins = max(int(np.max(absolute_maximum_index, initial=0)), first_valid_idx) + 1
+    wfm = wfm[:, :n_bins]
+    records = np.arange(wfm.shape[0])
+    bin_index = np.arange(wfm.shape[1])
+
+    # Peaks are range bins with higher power than both neighbours
+    # NOTE: The search is limited to the range bins between the first valid
+    #       index and the absolute maximum. As in cytfmra_findpeaks, the first
+    #       and last range bin of this subset only need to exceed their own power
+    #       minus a small offset at the subset boundaries.
+    is_peak = np.zeros(wfm.shape, dtype=bool)
+    with np.errstate(invalid="ignore"):
+        is_peak[:, 1:] = wfm[:, 1:] > wfm[:, :-1]
+        is_peak[:, first_valid_idx] = wfm[:, first_valid_idx] > wfm[:, first_valid_idx] - 1.e-6
+        is_higher_than_next = np.ones(wfm.shape, dtype=bool)
+        is_higher_than_next[:, :-1] = wfm[:, :-1] > wfm[:, 1:]
+        amax_power = wfm[records, absolute_maximum_index]
+        is_higher_than_next[records, absolute_maximum_index] = amax_power > amax_power - 1.e-6
+        is_peak &= is_higher_than_next
+        is_peak &= wfm >= peak_minimum_power[:, np.newaxis]
+    is_peak &= bin_index >= first_valid_idx
+    is_peak &= bin_index <= absolute_maximum_index[:, np.newaxis]
+
+    # Identify the first maximum (absolute maximum if no peak is found)
+    first_maximum_index = np.where(is_peak.any(axis=1), np.argmax(is_peak, axis=1), absolute_maximum_index)
+    first_maximum_index[absolute_maximum_index == -1] = -1
+
+    return first_maximum_index
+
+
+def get_threshold_ranges(rng, wfm, first_maximum_index, threshold, first_valid_idx=0):
+    """
+    Return the range value and the power of the retrack point at a given
+    threshold of the first maximum power for a stack of waveforms (vectorized
+    version of cTFMRA.get_threshold_range)
+    :param rng: (np.array, dim:(n_records, n_bins)) Window delay in meters
+    :param wfm: (np.array, dim:(n_records, n_bins)) Waveform power in normalized units
+    :param first_maximum_index: (np.array, dim:(n_records)) Index of first maximum
+    :param threshold: (float or np.array, dim:(n_records)) Power threshold
+    :param first_valid_idx: (int) First valid index for first maximum / leading edge
+    :return: tfmra range (np.array, dim:(n_records)), tfmra power (np.array, dim:(n_records)),
+        both NaN if the retrack point could not be determined
+    """
+
+    records = np.arange(wfm.shape[0])
+
+    # Get power of retracked point
+    first_maximum_power = wfm[records, first_maximum_index]
+    tfmra_power = threshold * first_maximum_power
+
+    # Get first index greater as threshold power between first valid index and first maximum
+    # NOTE: Only the range bins up to the last first maximum need to be searched
+    n_bins = max(int(np.max(first_maximum_index, initial=0)), 1)
+    bin_index = np.arange(n_bins)
+    with np.errstate(invalid="ignore"):
+        is_above = wfm[:, :n_bins] > tfmra_power[:, np.newaxis]
+    is_above &= bin_index >= first_valid_idx
+    is_above &= bin_index < first_maximum_index[:, np.newaxis]
+    has_retrack_point = is_above.any(axis=1)
+
+    # Use linear interpolation to get exact range value
+    i1 = np.argmax(is_above, axis=1)
+    i0 = i1 - 1
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gradient = (wfm[records, i1]-wfm[records, i0])/(rng[records, i1]-rng[records, i0])
+        tfmra_range = (tfmra_power - wfm[records, i0]) / gradient + rng[records, i0]
+
+    # Check if something went wrong with the first maximum
+    tfmra_range[~has_retrack_point] = np.nan
+    tfmra_power[~has_retrack_point] = np.nan
+
+    return tfmra_range, tfmra_power
+
+
+@lru_cache(maxsize=8)
+def get_oversampled_bin_index(n_os):
+    """
+    Return the (read-only) bin index array of the oversampled waveforms, which
+    is identical for all waveforms with the same number of range bins
+    :param n_os: (int) number of oversampled range bins
+    :return: (np.array, dim:(n_os)) bin index as float
+    """
+    bin_index = np.arange(n_os, dtype=np.float64)
+    bin_index.flags.writeable = False
+    return bin_index
+
+
+def get_wfms_maximum(wfm):
+    """
+    Return index and value of the maximum power of a stack of waveforms
+    in a single pass (NaN values are ignored)
+    :param wfm: (np.array, dim:(n_records, n_bins)) waveform power
+    :return: index of maximum (n_records, -1 for waveforms without valid power),
+        maximum power (n_records, NaN for waveforms without valid power)
+    """
+    maximum_index = np.argmax(wfm, axis=1)
+    maximum_power = np.take_along_axis(wfm, maximum_index[:, np.newaxis], axis=1)[:, 0]
+
+    # NOTE: np.argmax returns the index of the first NaN value (if any), which
+    #       therefore need to be treated separately
+    for i in np.flatnonzero(np.isnan(maximum_power)):
+        try:
+            maximum_index[i] = bn.nanargmax(wfm[i, :])
+        except ValueError:
+            maximum_index[i] = -1
+            continue
+        maximum_power[i] = wfm[i, maximum_index[i]]
+
+    return maximum_index, maximum_power
+
+
 def bnsmooth(x, window):
-    """ Bottleneck implementation of the IDL SMOOTH function """
+    """ Bottleneck implementation of the IDL SMOOTH function (along the last axis) """
     pad = int((window-1)/2)
-    n = len(x)
-    xpad = np.ndarray(shape=(n+window))
-    xpad[:pad] = 0.0
-    xpad[pad:n+pad] = x
-    xpad[n+pad:] = 0.0
-    return bn.move_mean(xpad, window=window, axis=0)[window-1:(window+n-1)]
\ No newline at end of file
+    n = x.shape[-1]
+    xpad = np.zeros(x.shape[:-1] + (n+window, ))
+    xpad[..., pad:n+pad] = x
+    return bn.move_mean(xpad, window=window, axis=-1)[..., window-1:(window+n-1)]
\ No newline at end of file
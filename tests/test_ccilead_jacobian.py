@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the analytic Jacobian of the SICCI lead waveform model
+"""
+
+import unittest
+
+import numpy as np
+from loguru import logger
+
+logger.disable("pysiral")
+
+from pysiral.retracker.ccilead import pl_lead_waveform_jacobian, pl_lead_waveform_model
+
+# Parameter sets (t_0, k, sigma, a)
+PARAMETER_SETS = [
+    (40.0, 0.5, 2.0, 1000.0),
+    (60.0, 1.5, 1.0, 1.0),
+    (53.7, 0.2, 3.0, 5000.0),
+    (30.25, 2.0, 0.5, 1.0),
+]
+
+
+class TestLeadWaveformJacobian(unittest.TestCase):
+
+    @staticmethod
+    def get_time(t_0, k, sigma):
+        """ Range bins including the boundaries of the piecewise model definition """
+        return np.sort(np.r_[np.arange(128, dtype=float), t_0, t_0 + k*sigma**2])
+
+    @staticmethod
+    def get_central_differences(t, parameters, rel_step=1.e-7):
+        """
+        Numerical Jacobian of the waveform model by central differences.
+
+        NOTE: The model is continuously differentiable at t = t_0 + k*sigma**2, but
+              its second derivative is not. The error of the central differences
+              at this boundary is therefore proportional to the step size.
+        """
+        parameters = np.array(parameters)
+        jacobian = np.empty((t.size, parameters.size))
+        for i in range(parameters.size):
+            step = rel_step * max(1.0, abs(parameters[i]))
+            parameters_plus, parameters_minus = parameters.copy(), parameters.copy()
+            parameters_plus[i] += step
+            parameters_minus[i] -= step
+            jacobian[:, i] = pl_lead_waveform_model(t, *parameters_plus) - pl_lead_waveform_model(t, *parameters_minus)
+            jacobian[:, i] /= 2. * step
+        return jacobian
+
+    def testShape(self):
+        t = np.arange(128, dtype=float)
+        jacobian = pl_lead_waveform_jacobian(t, *PARAMETER_SETS[0])
+        self.assertEqual(jacobian.shape, (t.size, 4))
+
+    def testPieceBoundaries(self):
+        for t_0, k, sigma, a in PARAMETER_SETS:
+            t = self.get_time(t_0, k, sigma)
+            self.assertIn(t_0, t)
+            self.assertIn(t_0 + k*sigma**2, t)
+
+    def testAgainstCentralDifferences(self):
+        for parameters in PARAMETER_SETS:
+            t = self.get_time(*parameters[:3])
+            jacobian = pl_lead_waveform_jacobian(t, *parameters)
+            jacobian_ref = self.get_central_differences(t, parameters)
+            self.assertTrue(np.all(np.isfinite(jacobian)))
+            for i in range(len(parameters)):
+                atol = 1.e-5 * np.max(np.abs(jacobian_ref[:, i]))
+                np.testing.assert_allclose(jacobian[:, i], jacobian_ref[:, i], rtol=0, atol=atol,
+                                           err_msg=f"parameters={parameters} column={i}")
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestLeadWaveformJacobian)
+    unittest.TextTestRunner(verbosity=2).run(suite)
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the extraction of gridded variables along a trajectory
+"""
+
+import unittest
+
+import numpy as np
+import scipy.ndimage as ndimage
+from loguru import logger
+from pyproj import Proj
+
+logger.disable("pysiral")
+
+from pysiral.grid import GridTrajectoryExtract
+
+
+class TestGridTrajectoryExtract(unittest.TestCase):
+
+    def setUp(self):
+        projection = {"proj": "stere", "ellps": "WGS84", "lon_0": -45, "lat_0": 90, "lat_ts": 70}
+        dimension = {"n_cols": 20, "n_lines": 16, "dx": 25000., "dy": 25000.}
+        self.grid_shape = (dimension["n_lines"], dimension["n_cols"])
+
+        # Trajectory crossing the grid that starts and ends outside the grid
+        # (grid extent in x: +/- 237.5 km)
+        p = Proj(**projection)
+        x = np.linspace(-400000., 400000., 101)
+        y = np.linspace(-150000., 120000., 101)
+        lon, lat = p(x, y, inverse=True)
+        self.extract = GridTrajectoryExtract(lon, lat, {"projection": projection, "dimension": dimension})
+
+        rng = np.random.default_rng(42)
+        self.float_grid = rng.uniform(-10., 10., self.grid_shape)
+        self.int_grid = rng.integers(-1000, 1000, self.grid_shape).astype(np.int16)
+
+    def constant_mode_reference(self, grid_var, order, outside_value=np.nan):
+        return ndimage.map_coordinates(grid_var, self.extract.image_coordinates, order=order,
+                                       mode="constant", cval=outside_value)
+
+    def testTrajectoryLeavesGrid(self):
+        iy, ix = self.extract.image_coordinates
+        n_lines, n_cols = self.grid_shape
+        is_outside = (iy < 0) | (iy > n_lines - 1) | (ix < 0) | (ix > n_cols - 1)
+        self.assertTrue(np.any(is_outside))
+        self.assertFalse(np.all(is_outside))
+
+    def testFloatGrid(self):
+        for order in [0, 1, 3]:
+            for flipud in [False, True]:
+                grid_var = np.flipud(self.float_grid) if flipud else self.float_grid
+                reference = self.constant_mode_reference(grid_var, order)
+                result = self.extract.get_from_grid_variable(self.float_grid, order=order, flipud=flipud)
+                np.testing.assert_array_equal(result, reference)
+                self.assertTrue(np.any(np.isnan(result)))
+
+    def testFloatGridOutsideValue(self):
+        for order in [0, 1]:
+            reference = self.constant_mode_reference(self.float_grid, order, outside_value=-999.)
+            result = self.extract.get_from_grid_variable(self.float_grid, order=order, outside_value=-999.)
+            np.testing.assert_array_equal(result, reference)
+
+    def testIntegerGrid(self):
+        for order in [0, 1]:
+            for outside_value in [np.nan, 0, -1.7]:
+                reference = self.constant_mode_reference(self.int_grid, order, outside_value=outside_value)
+                result = self.extract.get_from_grid_variable(self.int_grid, order=order,
+                                                             outside_value=outside_value)
+                self.assertEqual(result.dtype, self.int_grid.dtype)
+                np.testing.assert_array_equal(result, reference)
+
+
+if __name__ == '__main__':
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestGridTrajectoryExtract)
+    unittest.TextTestRunner(verbosity=2).run(suite)
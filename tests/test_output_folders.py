@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the creation of output folders
+"""
+
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+from loguru import logger
+
+logger.disable("pysiral")
+
+from pysiral.core.output import MissionOutputContext, PysiralOutputFolder, bulk_create
+
+
+class LocalConfig(object):
+    """ Minimal (hashable) package configuration with a local l1b repository """
+
+    def __init__(self, l1bdata_path, mission_id="cryosat2", version="default"):
+        l1b_repository = {mission_id: {version: SimpleNamespace(l1bdata=l1bdata_path)}}
+        self.local_machine = SimpleNamespace(l1b_repository=l1b_repository)
+
+
+class TestBulkCreate(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.base_path = self.tmp_dir.name
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def testCreateFolders(self):
+        paths = [os.path.join(self.base_path, "a", "2020", f"{month:02d}") for month in range(1, 13)]
+        bulk_create(paths)
+        for path in paths:
+            self.assertTrue(os.path.isdir(path))
+
+    def testEmptyInput(self):
+        with mock.patch("os.makedirs") as makedirs:
+            bulk_create([])
+        makedirs.assert_not_called()
+
+    def testDuplicatePaths(self):
+        # NOTE: Single folder level, since os.makedirs is called recursively for parent folders
+        path = os.path.join(self.base_path, "a")
+        with mock.patch("os.makedirs", wraps=os.makedirs) as makedirs:
+            bulk_create([path, path, path])
+        makedirs.assert_called_once_with(path, exist_ok=True)
+        self.assertTrue(os.path.isdir(path))
+
+    def testExistingFolders(self):
+        path = os.path.join(self.base_path, "a")
+        os.makedirs(path)
+        bulk_create([path])
+        self.assertTrue(os.path.isdir(path))
+
+    def testWorkerErrorIsRaised(self):
+        # A folder cannot be created below a regular file
+        file_path = os.path.join(self.base_path, "file")
+        with open(file_path, "w"):
+            pass
+        paths = [os.path.join(self.base_path, "a"), os.path.join(file_path, "b")]
+        with self.assertRaises(OSError):
+            bulk_create(paths)
+
+
+class TestPrecreateMonthTree(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.l1bdata_path = os.path.join(self.tmp_dir.name, "l1bdata")
+        self.config = LocalConfig(self.l1bdata_path)
+        PysiralOutputFolder.clear_created_dirs()
+
+    def tearDown(self):
+        PysiralOutputFolder.clear_created_dirs()
+        self.tmp_dir.cleanup()
+
+    def precreate(self, year_months):
+        return PysiralOutputFolder.precreate_month_tree(self.config, "cryosat2", "default", "north", year_months)
+
+    def get_output_folder(self, year, month):
+        output_folder = PysiralOutputFolder()
+        output_folder.config = self.config
+        output_folder.l1bdata_from_list("cryosat2", "default", "north", year, month)
+        return output_folder
+
+    def testPaths(self):
+        paths = self.precreate([(2021, 1), (2020, 12), (2020, 11), (2020, 12)])
+        expected_paths = [os.path.join(self.l1bdata_path, "north", "2020", "11"),
+                          os.path.join(self.l1bdata_path, "north", "2020", "12"),
+                          os.path.join(self.l1bdata_path, "north", "2021", "01")]
+        self.assertEqual(paths, expected_paths)
+        for path in paths:
+            self.assertTrue(os.path.isdir(path))
+
+    def testSamePathAsOutputFolder(self):
+        paths = self.precreate([(2020, 3)])
+        self.assertEqual(paths, [self.get_output_folder(2020, 3).path])
+
+    def testCreateSkipsPrecreatedFolder(self):
+        self.precreate([(2020, 3)])
+        output_folder = self.get_output_folder(2020, 3)
+        with mock.patch("os.makedirs") as makedirs:
+            output_folder.create()
+        makedirs.assert_not_called()
+
+    def testCreateAfterFolderRemoval(self):
+        paths = self.precreate([(2020, 3)])
+        os.rmdir(paths[0])
+        self.get_output_folder(2020, 3).create()
+        self.assertTrue(os.path.isdir(paths[0]))
+
+    def testPrecreateSkipsCreatedFolders(self):
+        self.precreate([(2020, 3)])
+        with mock.patch("pysiral.core.output.bulk_create") as bulk_create_mock:
+            self.precreate([(2020, 3), (2020, 4)])
+        bulk_create_mock.assert_called_once_with([os.path.join(self.l1bdata_path, "north", "2020", "04")])
+
+
+class TestMissionOutputContext(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.l1bdata_path = os.path.join(self.tmp_dir.name, "l1bdata")
+        self.config = LocalConfig(self.l1bdata_path)
+        self.context = MissionOutputContext("cryosat2", "default", "south", config=self.config)
+        PysiralOutputFolder.clear_created_dirs()
+
+    def tearDown(self):
+        PysiralOutputFolder.clear_created_dirs()
+        self.tmp_dir.cleanup()
+
+    def testPathFor(self):
+        path = self.context.path_for(2019, 4)
+        self.assertEqual(path, os.path.join(self.l1bdata_path, "south", "2019", "04"))
+        self.assertFalse(os.path.exists(path))
+
+    def testCreate(self):
+        path = self.context.create(2019, 4)
+        self.assertEqual(path, self.context.path_for(2019, 4))
+        self.assertTrue(os.path.isdir(path))
+
+    def testCreateSkipsCreatedFolder(self):
+        self.context.create(2019, 4)
+        with mock.patch("os.makedirs") as makedirs:
+            self.context.create(2019, 4)
+        makedirs.assert_not_called()
+
+    def testCreateSkipsPrecreatedFolder(self):
+        PysiralOutputFolder.precreate_month_tree(self.config, "cryosat2", "default", "south", [(2019, 4)])
+        with mock.patch("os.makedirs") as makedirs:
+            self.context.create(2019, 4)
+        makedirs.assert_not_called()
+
+    def testCreateAfterFolderRemoval(self):
+        path = self.context.create(2019, 4)
+        os.rmdir(path)
+        self.context.create(2019, 4)
+        self.assertTrue(os.path.isdir(path))
+
+
+if __name__ == '__main__':
+    for test_case in [TestBulkCreate, TestPrecreateMonthTree, TestMissionOutputContext]:
+        suite = unittest.TestLoader().loadTestsFromTestCase(test_case)
+        unittest.TextTestRunner(verbosity=2).run(suite)
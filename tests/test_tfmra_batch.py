@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the batch (vectorized) TFMRA functions against the single
+waveform methods of cTFMRA
+"""
+
+import unittest
+import warnings
+
+import numpy as np
+from loguru import logger
+
+logger.disable("pysiral")
+
+from pysiral.retracker.tfmra import (CYTFMRA_OK, cTFMRA, get_filtered_wfms,
+                                     get_first_maximum_indices, get_threshold_ranges,
+                                     get_wfms_maximum)
+
+
+def get_synthetic_wfms(n_records=500, n_bins=256, seed=42):
+    """
+    Returns a stack of normalized waveforms with a noise floor, an optional
+    smaller peak on the leading edge and a main peak.
+    """
+    rng = np.random.default_rng(seed)
+    bins = np.arange(n_bins, dtype=float)
+    main_peak_idx = rng.uniform(40, 200, n_records)
+    first_peak_idx = main_peak_idx - rng.uniform(3, 30, n_records)
+    first_peak_power = rng.uniform(0., 0.9, n_records)
+    wfm = np.exp(-0.5 * ((bins - main_peak_idx[:, np.newaxis]) / 3.) ** 2)
+    wfm += first_peak_power[:, np.newaxis] * np.exp(-0.5 * ((bins - first_peak_idx[:, np.newaxis]) / 2.) ** 2)
+    wfm += rng.uniform(0., 0.05, wfm.shape)
+    return wfm / np.max(wfm, axis=1)[:, np.newaxis]
+
+
+def get_synthetic_rng(n_records=500, n_bins=256, seed=43):
+    """
+    Returns a stack of range windows (window delay in meters)
+    """
+    rng = np.random.default_rng(seed)
+    window_start = rng.uniform(700000., 800000., n_records)
+    return window_start[:, np.newaxis] + 0.2342 * np.arange(n_bins, dtype=float)
+
+
+class TestFilteredWfms(unittest.TestCase):
+
+    def setUp(self):
+        self.wfm = get_synthetic_wfms(n_records=20, n_bins=128) * 1000.
+        self.rng = get_synthetic_rng(n_records=20, n_bins=128)
+
+        # Waveform without power
+        self.wfm[3, :] = 0.0
+
+    def testZeroPowerWaveform(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            filt_rng, filt_wfm, norm, absolute_maximum_index = get_filtered_wfms(self.rng, self.wfm, 10, 11)
+        self.assertEqual(norm[3], 0.0)
+        self.assertEqual(absolute_maximum_index[3], -1)
+        self.assertTrue(np.all(np.isnan(filt_wfm[3, :])))
+
+        peak_minimum_power = np.full(self.wfm.shape[0], 0.5)
+        fmi = get_first_maximum_indices(filt_wfm, peak_minimum_power, 0, absolute_maximum_index)
+        self.assertEqual(fmi[3], -1)
+
+        is_valid = np.arange(self.wfm.shape[0]) != 3
+        self.assertTrue(np.all(absolute_maximum_index[is_valid] >= 0))
+        np.testing.assert_allclose(np.max(filt_wfm[is_valid, :], axis=1), 1.0)
+
+
+@unittest.skipUnless(CYTFMRA_OK, "cytfmra extension not available")
+class TestFirstMaximumIndices(unittest.TestCase):
+
+    def setUp(self):
+        self.first_valid_idx = 20
+        self.wfm = get_synthetic_wfms()
+        n_records = self.wfm.shape[0]
+
+        # Waveforms without valid power
+        self.wfm[:5, :] = np.nan
+
+        # Isolated NaN bins (also on the leading edge and at the first valid index)
+        rng = np.random.default_rng(1)
+        rows = np.arange(5, n_records, 3)
+        self.wfm[rows, rng.integers(0, self.wfm.shape[1], rows.size)] = np.nan
+        self.wfm[rows[:10], self.first_valid_idx] = np.nan
+
+        # Absolute maximum before the first valid index
+        self.wfm[10, :] = 0.1
+        self.wfm[10, self.first_valid_idx - 5] = 1.0
+
+        # Peak exactly at the first valid index: The bin before is larger,
+        # the peak is therefore only found by the subset boundary rule
+        self.wfm[11, :] = 0.1
+        self.wfm[11, self.first_valid_idx - 1] = 0.9
+        self.wfm[11, self.first_valid_idx] = 0.8
+        self.wfm[11, self.first_valid_idx + 1] = 0.5
+        self.wfm[11, self.first_valid_idx + 20] = 1.0
+
+        rng = np.random.default_rng(2)
+        self.peak_minimum_power = rng.uniform(0.1, 0.7, n_records)
+
+    def get_batch_first_maximum_indices(self):
+        absolute_maximum_index, _ = get_wfms_maximum(self.wfm)
+        fmi = get_first_maximum_indices(self.wfm, self.peak_minimum_power,
+                                        self.first_valid_idx, absolute_maximum_index)
+        return fmi, absolute_maximum_index
+
+    def testAgainstSingleWaveform(self):
+        fmi, absolute_maximum_index = self.get_batch_first_maximum_indices()
+        for i in np.flatnonzero(absolute_maximum_index >= self.first_valid_idx):
+            fmi_ref = cTFMRA.get_first_maximum_index(self.wfm[i, :], self.peak_minimum_power[i],
+                                                     first_valid_idx=self.first_valid_idx)
+            self.assertEqual(fmi[i], fmi_ref, msg=f"record {i}")
+
+    def testInvalidWaveforms(self):
+        fmi, absolute_maximum_index = self.get_batch_first_maximum_indices()
+        np.testing.assert_array_equal(absolute_maximum_index[:5], -1)
+        np.testing.assert_array_equal(fmi[:5], -1)
+        for i in range(5):
+            fmi_ref = cTFMRA.get_first_maximum_index(self.wfm[i, :], self.peak_minimum_power[i],
+                                                     first_valid_idx=self.first_valid_idx)
+            self.assertEqual(fmi_ref, -1)
+
+    def testAbsoluteMaximumBeforeFirstValidIndex(self):
+        # NOTE: The single waveform method cannot handle this case (empty search
+        #       range), the batch version returns the absolute maximum
+        fmi, absolute_maximum_index = self.get_batch_first_maximum_indices()
+        self.assertEqual(absolute_maximum_index[10], self.first_valid_idx - 5)
+        self.assertEqual(fmi[10], self.first_valid_idx - 5)
+
+    def testPeakAtFirstValidIndex(self):
+        fmi, _ = self.get_batch_first_maximum_indices()
+        self.assertEqual(fmi[11], self.first_valid_idx)
+
+
+class TestThresholdRanges(unittest.TestCase):
+
+    def setUp(self):
+        self.first_valid_idx = 20
+        self.wfm = get_synthetic_wfms()
+        self.rng = get_synthetic_rng()
+        n_records = self.wfm.shape[0]
+
+        # First maximum index (-1 for waveforms without valid power)
+        self.wfm[:5, :] = np.nan
+        self.fmi, _ = get_wfms_maximum(self.wfm)
+
+        # Invalid first maximum index for a waveform with valid power
+        self.fmi[5] = -1
+
+        rng = np.random.default_rng(3)
+        self.threshold = rng.uniform(0.2, 0.8, n_records)
+
+    def assertEqualToSingleWaveform(self, threshold, first_valid_idx, rows=None):
+        rows = np.arange(self.wfm.shape[0]) if rows is None else rows
+        tfmra_range, tfmra_power = get_threshold_ranges(self.rng[rows, :], self.wfm[rows, :], self.fmi[rows],
+                                                        threshold[rows], first_valid_idx)
+        for i, row in enumerate(rows):
+            if self.fmi[row] == -1 and np.any(np.isfinite(self.wfm[row, :])):
+                continue
+            range_ref, power_ref, _ = cTFMRA.get_threshold_range(self.rng[row, :], self.wfm[row, :],
+                                                                 self.fmi[row], threshold[row],
+                                                                 first_valid_idx=first_valid_idx)
+            np.testing.assert_array_equal(tfmra_range[i], range_ref, err_msg=f"record {row}")
+            np.testing.assert_array_equal(tfmra_power[i], power_ref, err_msg=f"record {row}")
+        return tfmra_range, tfmra_power
+
+    def testAgainstSingleWaveform(self):
+        for first_valid_idx in [0, self.first_valid_idx]:
+            tfmra_range, _ = self.assertEqualToSingleWaveform(self.threshold, first_valid_idx)
+            self.assertTrue(np.all(np.isfinite(tfmra_range[6:])))
+
+    def testInvalidFirstMaximumIndex(self):
+        # NOTE: A first maximum index of -1 marks a failed first maximum
+        #       and results in NaN for waveforms with and without valid power
+        tfmra_range, tfmra_power = self.assertEqualToSingleWaveform(self.threshold, self.first_valid_idx)
+        self.assertTrue(np.all(np.isnan(tfmra_range[:6])))
+        self.assertTrue(np.all(np.isnan(tfmra_power[:6])))
+
+    def testCrossingAtFirstBin(self):
+        # All range bins are above the threshold, the retrack point is
+        # therefore interpolated between the last and the first range bin
+        # (index -1 and 0) as in the single waveform method
+        threshold = np.full(self.wfm.shape[0], 0.1)
+        rows = np.arange(6, 20)
+        self.wfm[rows, 0] = 0.2
+        tfmra_range, _ = self.assertEqualToSingleWaveform(threshold, 0, rows=rows)
+        self.assertTrue(np.all(np.isfinite(tfmra_range)))
+
+    def testNoBinAboveThreshold(self):
+        threshold = np.full(self.wfm.shape[0], 1.5)
+        tfmra_range, tfmra_power = self.assertEqualToSingleWaveform(threshold, self.first_valid_idx)
+        self.assertTrue(np.all(np.isnan(tfmra_range)))
+        self.assertTrue(np.all(np.isnan(tfmra_power)))
+
+
+if __name__ == '__main__':
+    for test_case in [TestFilteredWfms, TestFirstMaximumIndices, TestThresholdRanges]:
+        suite = unittest.TestLoader().loadTestsFromTestCase(test_case)
+        unittest.TextTestRunner(verbosity=2).run(suite)